@@ -0,0 +1,114 @@
+# batch.py
+"""
+Genera senza interfaccia grafica i PDF di più liste di carte (file di testo
+nel formato accettato dalla GUI, comprese le esportazioni di Arena e
+Moxfield), distribuendole su un pool di processi.
+Tutti i processi condividono la cache delle carte e delle immagini e un
+unico limite di richieste verso Scryfall.
+
+    python batch.py <cartella o glob> [-o cartella di destinazione]
+                    [--mode both|cards|suggestions] [--lands none|basic|all]
+                    [--versions include|exclude] [--processes N]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import decklist
+import scryfall_api
+from pdf_generator import create_pdf
+from rate_limiter import SharedTokenBucket
+from config import BASE_DIR, API_RATE_LIMIT, API_BURST
+
+
+def find_decklists(source):
+    """I file .txt di una cartella, oppure i file che corrispondono a un glob, in ordine."""
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, "*.txt"))
+    else:
+        paths = glob.glob(source)
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+def _init_worker(bucket_state):
+    # Ogni processo attinge allo stesso budget di richieste invece di averne uno proprio
+    scryfall_api.limiter.bucket = SharedTokenBucket(API_RATE_LIMIT, API_BURST, bucket_state)
+
+
+def render_decklist(path, output_dir, generation_mode="both", lands_exclusion="none",
+                    version_exclusion="include"):
+    """Genera il PDF di una lista e restituisce (percorso del PDF, numero di carte, secondi)."""
+    start = time.perf_counter()
+    with open(path, "r", encoding="utf-8") as f:
+        pdf_cards, ai_cards, card_counts, printings = decklist.summarize(decklist.iter_decklist(f))
+    if not pdf_cards:
+        raise ValueError("la lista non contiene carte")
+    name = os.path.splitext(os.path.basename(path))[0]
+    output_pdf = os.path.join(output_dir, f"{name}.pdf")
+    create_pdf(pdf_cards, ai_cards, card_counts, output_pdf, generation_mode=generation_mode,
+               lands_exclusion=lands_exclusion, version_exclusion=version_exclusion, printings=printings)
+    return output_pdf, sum(card_counts.values()), time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera i PDF di più liste di carte in parallelo.")
+    parser.add_argument("source", help="cartella con le liste (.txt) oppure glob, es. 'liste/*.txt'")
+    parser.add_argument("-o", "--output", default=os.path.join(BASE_DIR, "liste"),
+                        help="cartella in cui salvare i PDF (default: liste/, come la GUI)")
+    parser.add_argument("--mode", choices=("both", "cards", "suggestions"), default="both",
+                        help="contenuto del PDF (default: both)")
+    parser.add_argument("--lands", choices=("none", "basic", "all"), default="none",
+                        help="lands da escludere (default: none)")
+    parser.add_argument("--versions", choices=("include", "exclude"), default="include",
+                        help="mostrare o no le altre versioni delle carte (default: include)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="numero di processi (default: uno per CPU, al massimo uno per lista)")
+    args = parser.parse_args(argv)
+
+    decklists = find_decklists(args.source)
+    if not decklists:
+        print(f"Nessuna lista trovata in '{args.source}'.")
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+    processes = args.processes or min(len(decklists), os.cpu_count() or 1)
+    bucket = SharedTokenBucket(API_RATE_LIMIT, API_BURST)
+    print(f"{len(decklists)} liste da generare con {processes} processi.")
+
+    results = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(bucket.state,)) as executor:
+        futures = {
+            executor.submit(render_decklist, path, args.output, args.mode, args.lands, args.versions): path
+            for path in decklists
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                print(f"Errore nella generazione di '{path}': {e}")
+                results[path] = e
+    elapsed = time.perf_counter() - start
+
+    print()
+    print(f"{'Lista':<40} {'Carte':>6} {'Secondi':>8}  PDF")
+    failures = 0
+    for path in decklists:
+        name = os.path.basename(path)
+        result = results[path]
+        if isinstance(result, Exception):
+            failures += 1
+            print(f"{name:<40} {'-':>6} {'-':>8}  errore: {result}")
+        else:
+            output_pdf, cards, seconds = result
+            print(f"{name:<40} {cards:>6} {seconds:>8.1f}  {output_pdf}")
+    print(f"Totale: {len(decklists) - failures} PDF su {len(decklists)} in {elapsed:.1f} secondi.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+# benchmarks/bench_decks.py
+"""
+Benchmark end-to-end senza rete: avvia il finto Scryfall locale
+(fake_scryfall.py) e genera i mazzi di benchmarks/decks con create_pdf e
+mec_prof.generate_mechanics_content, ciascuno in un processo nuovo e con
+una cache vuota (cold) e poi già popolata (warm); i PDF vengono poi
+rigenerati dopo aver sostituito una carta della lista (edit), per misurare
+quanto rende la cache dei frammenti. Per ogni esecuzione riporta tempo,
+richieste HTTP, byte trasferiti, dimensione del PDF e picco di memoria
+(RSS); i risultati vengono aggiunti a benchmarks/results/ e confrontati
+con l'esecuzione precedente.
+
+    python benchmarks/bench_decks.py [scenario ...] [--advice-delay secondi] [--no-save]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+DECKS_DIR = os.path.join(BENCH_DIR, "decks")
+RESULTS_FILE = os.path.join(BENCH_DIR, "results", "bench_decks.jsonl")
+
+# Carta che nell'esecuzione "edit" prende il posto della prima della lista
+EDIT_CARD = "Benchmark Replacement Card"
+
+# nome -> (lista, operazione, opzioni di create_pdf)
+SCENARIOS = {
+    "small": ("small.txt", "pdf", {}),
+    "commander": ("commander.txt", "pdf", {"lands_exclusion": "basic"}),
+    "staples": ("staples.txt", "pdf", {}),
+    "commander-mechanics": ("commander.txt", "mechanics", {}),
+}
+
+
+class _TextInput:
+    """Sostituto del widget di testo Tk letto da mec_prof."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def get(self, start, end):
+        return self.text
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss è in KiB su Linux e in byte su macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_child(task, deck_path, output_pdf, options):
+    """Eseguito nel processo figlio: genera il mazzo e stampa le misure come JSON."""
+    sys.path.insert(0, ROOT)
+    with open(deck_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    import metrics
+    start = time.perf_counter()
+    if task == "pdf":
+        from pdf_generator import create_pdf, load_card_list_from_text
+        pdf_cards, ai_cards, card_counts = load_card_list_from_text(text)
+        report = create_pdf(pdf_cards, ai_cards, card_counts, output_pdf, **options)
+    else:
+        import mec_prof
+        mec_prof.generate_mechanics_content(_TextInput(text))
+        report = metrics.report()
+    wall_time = time.perf_counter() - start
+    print(json.dumps({
+        "wall_time": round(wall_time, 3),
+        "peak_rss_mb": _peak_rss_mb(),
+        # Dal report delle metriche: dove è andato il tempo e quanto hanno reso le cache
+        "stages": {stage: data["seconds"] for stage, data in report["stages"].items()},
+        "cache_hit_ratios": {name: data["hit_ratio"] for name, data in report["caches"].items()},
+        "throttled_seconds": report.get("rate_limiter", {}).get("throttled_seconds"),
+    }))
+
+
+def edited_deck(deck_path, output_dir):
+    """Copia della lista con la prima carta sostituita da EDIT_CARD."""
+    with open(deck_path, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    lines[0] = f"1 {EDIT_CARD}"
+    path = os.path.join(output_dir, "edit-" + os.path.basename(deck_path))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def run_scenario(fake, name, cache, cache_dir, output_dir):
+    deck, task, options = SCENARIOS[name]
+    deck_path = os.path.join(DECKS_DIR, deck)
+    if cache == "edit":
+        deck_path = edited_deck(deck_path, output_dir)
+    output_pdf = os.path.join(output_dir, f"{name}.pdf")
+    if os.path.exists(output_pdf):
+        os.remove(output_pdf)
+    env = dict(os.environ, **fake.env(), MTG_CACHE_DIR=cache_dir, MTG_OFFLINE_MODE="0")
+    fake.reset_stats()
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", task, deck_path, output_pdf,
+         json.dumps(options)],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"lo scenario {name} è fallito:\n{result.stderr or result.stdout}")
+    measures = json.loads(result.stdout.strip().splitlines()[-1])
+    stats = fake.stats
+    measures.update({
+        "http_requests": stats["requests"],
+        "bytes_transferred": stats["bytes_sent"] + stats["bytes_received"],
+        "endpoints": dict(sorted(stats["endpoints"].items())),
+        "pdf_bytes": os.path.getsize(output_pdf) if task == "pdf" else None,
+    })
+    return measures
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _previous_results():
+    previous = {}
+    try:
+        with open(RESULTS_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                previous[(record["scenario"], record["cache"])] = record
+    except (OSError, ValueError):
+        pass
+    return previous
+
+
+def _format_bytes(value):
+    if value is None:
+        return "-"
+    for unit in ("B", "KB", "MB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dei mazzi contro un finto Scryfall locale.")
+    parser.add_argument("scenarios", nargs="*",
+                        help=f"scenari da eseguire (default: tutti): {', '.join(SCENARIOS)}")
+    parser.add_argument("--advice-delay", type=float, default=0.0,
+                        help="latenza simulata della risposta dei consigli, in secondi")
+    parser.add_argument("--no-save", action="store_true", help="non salvare i risultati")
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"scenari sconosciuti: {', '.join(unknown)}")
+
+    sys.path.insert(0, BENCH_DIR)
+    from fake_scryfall import FakeScryfall
+
+    previous = _previous_results()
+    commit = _git_commit()
+    records = []
+    fake = FakeScryfall(advice_delay=args.advice_delay).start()
+    work_dir = tempfile.mkdtemp(prefix="mtg-bench-")
+    try:
+        print(f"{'Scenario':<22}{'Cache':<6}{'Tempo':>8}{'Richieste':>10}{'Trasferiti':>12}"
+              f"{'PDF':>10}{'RSS':>9}  Rispetto a prima")
+        for name in args.scenarios or SCENARIOS:
+            cache_dir = os.path.join(work_dir, name)
+            runs = ("cold", "warm", "edit") if SCENARIOS[name][1] == "pdf" else ("cold", "warm")
+            for cache in runs:
+                measures = run_scenario(fake, name, cache, cache_dir, work_dir)
+                record = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit,
+                          "scenario": name, "cache": cache, **measures}
+                records.append(record)
+                before = previous.get((name, cache))
+                delta = ""
+                if before and before.get("wall_time"):
+                    change = (measures["wall_time"] - before["wall_time"]) / before["wall_time"] * 100
+                    delta = f"{change:+.0f}% tempo ({before.get('commit') or before['timestamp']})"
+                rss = measures["peak_rss_mb"]
+                print(f"{name:<22}{cache:<6}{measures['wall_time']:>7.2f}s{measures['http_requests']:>10}"
+                      f"{_format_bytes(measures['bytes_transferred']):>12}{_format_bytes(measures['pdf_bytes']):>10}"
+                      f"{(f'{rss:.0f} MB' if rss is not None else '-'):>9}  {delta}")
+    finally:
+        fake.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        with open(RESULTS_FILE, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        print(f"Risultati aggiunti a {RESULTS_FILE}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run_child(sys.argv[2], sys.argv[3], sys.argv[4], json.loads(sys.argv[5]))
+    else:
+        main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_import.py
+"""
+Misura l'avvio a freddo con `python -X importtime`: l'import della GUI e
+quello di un'esecuzione senza interfaccia (pdf_generator + mec_prof).
+Per ciascuno stampa il tempo totale (il migliore su più esecuzioni) e i
+moduli più costosi. Termina con codice 1 se all'avvio vengono caricate
+dipendenze che devono restare differite (ReportLab, PIL) o se un tempo
+supera il limite indicato.
+
+    python benchmarks/bench_import.py [esecuzioni] [limite in ms]
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "gui": "import gui",
+    "headless": "import pdf_generator, mec_prof",
+}
+# Moduli che non devono comparire all'avvio: servono solo per disegnare il PDF
+DEFERRED = ("reportlab", "PIL")
+
+
+def measure(statement):
+    """
+    Esegue l'import in un interprete nuovo e restituisce (totale in µs,
+    dizionario modulo -> tempo cumulativo in µs).
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    modules = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in
+                                           line.replace("import time:", "|", 1).split("|")]
+        modules[name] = int(cumulative_us)
+        # Solo i moduli importati direttamente (senza rientro) contano nel totale
+        if not line.split("|")[2].startswith("  "):
+            total += int(cumulative_us)
+    return total, modules
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    limit_ms = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    failed = False
+    for label, statement in TARGETS.items():
+        best_total, best_modules = min(measure(statement) for _ in range(runs))
+        print(f"{label:<10} {best_total / 1000:8.1f} ms  ({statement})")
+        slowest = sorted(best_modules.items(), key=lambda item: item[1], reverse=True)[:8]
+        for name, cumulative in slowest:
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+        deferred = sorted(name for name in best_modules if name.split(".")[0] in DEFERRED)
+        if deferred:
+            print(f"ATTENZIONE: moduli caricati all'avvio che dovrebbero essere differiti: {', '.join(deferred[:5])}")
+            failed = True
+        if limit_ms is not None and best_total / 1000 > limit_ms:
+            print(f"ATTENZIONE: {label} supera il limite di {limit_ms:.0f} ms")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
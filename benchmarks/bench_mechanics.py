@@ -0,0 +1,55 @@
+# benchmarks/bench_mechanics.py
+"""
+Confronta il costo per carta del riconoscimento delle meccaniche: una ricerca
+regex per ogni voce del vocabolario (vecchio metodo) contro l'unica
+espressione compilata di mechanics.MechanicsMatcher.
+
+    python benchmarks/bench_mechanics.py [numero di carte]
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mechanics
+
+FILLER = ("When this creature enters, target player draws a card and loses 2 life. "
+          "At the beginning of your upkeep, put a +1/+1 counter on each creature you control. ")
+
+
+def synthetic_oracle_texts(vocab, count, seed=0):
+    rng = random.Random(seed)
+    keys = list(vocab)
+    return [FILLER + " ".join(rng.sample(keys, rng.randint(0, 4))) + ". " + FILLER for _ in range(count)]
+
+
+def find_per_entry(vocab, text):
+    return [mechanic for mechanic in vocab
+            if re.search(r'\b' + re.escape(mechanic) + r'\b', text, re.IGNORECASE)]
+
+
+def bench(label, func, texts):
+    start = time.perf_counter()
+    results = [func(text) for text in texts]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1e6 / len(texts):10.1f} µs/carta")
+    return results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    vocab = mechanics.load_vocabulary()
+    matcher = mechanics.MechanicsMatcher(vocab)
+    texts = synthetic_oracle_texts(vocab, count)
+    print(f"{len(vocab)} voci nel vocabolario, {count} carte")
+    expected = bench("una regex per voce", lambda text: find_per_entry(vocab, text), texts)
+    found = bench("MechanicsMatcher", matcher.find, texts)
+    if found != expected:
+        print("ATTENZIONE: i risultati dei due metodi non coincidono")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# benchmarks/fake_scryfall.py
+"""
+Server HTTP locale che imita le parti di Scryfall usate dal programma
+(/cards/named, /cards/search, /cards/collection, prints_search_uri e
+immagini), il servizio del cambio USD -> EUR e l'endpoint delle chat
+completions dei consigli. Le carte sono fixture generate in modo
+deterministico dal nome, così ogni esecuzione riceve le stesse risposte;
+le immagini sono JPEG distinti per URL, di dimensioni realistiche.
+Il server conta richieste e byte trasferiti per endpoint.
+
+    python benchmarks/fake_scryfall.py [porta]
+"""
+import hashlib
+import io
+import json
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Come Scryfall: risultati per pagina delle ricerche e limite di /cards/collection
+PAGE_SIZE = 175
+COLLECTION_LIMIT = 75
+IMAGE_SIZES = {"normal": (488, 680), "small": (146, 204), "large": (672, 936), "png": (745, 1040)}
+
+BASIC_LANDS = {"plains": "W", "island": "U", "swamp": "B", "mountain": "R", "forest": "G"}
+# Carte ristampate moltissime volte (il mazzo di staples le usa tutte)
+HEAVILY_REPRINTED = {
+    "sol ring", "lightning bolt", "counterspell", "swords to plowshares", "llanowar elves",
+    "dark ritual", "giant growth", "shock", "disenchant", "terror", "serra angel", "shivan dragon",
+    "birds of paradise", "wrath of god", "doom blade", "naturalize", "negate", "duress",
+    "cultivate", "rampant growth", "arcane signet", "command tower", "evolving wilds",
+    "opt", "brainstorm", "path to exile", "mind stone", "lightning greaves", "divination",
+    "pacifism",
+}
+KEYWORDS = ["Flying", "Trample", "Deathtouch", "Lifelink", "Haste", "Vigilance", "First strike", "Reach",
+            "Flash", "Menace", "Hexproof", "Indestructible", "Ward {2}", "Scry 2", "Cycling {2}",
+            "Kicker {1}{G}", "Flashback {3}{R}", "Convoke", "Cascade", "Landfall"]
+TYPES = ["Creature — Elf Druid", "Instant", "Sorcery", "Artifact", "Enchantment",
+         "Creature — Human Wizard", "Legendary Creature — Dragon", "Artifact — Equipment"]
+COLORS = "WUBRG"
+ADVICE = ("## Valutazione\n- Curva di mana **equilibrata**\n- Buona interazione\n\n"
+          "## Suggerimenti\n- Aggiungi qualche fonte di pescaggio\n- Valuta più rimozioni istantanee")
+
+
+def _seed(*parts):
+    return int(hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest(), 16)
+
+
+def _uuid(seed):
+    h = f"{seed:040x}"[:32]
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+class Fixtures:
+    """Dati delle carte generati dal nome, con gli URL che puntano al server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def oracle_id(self, name):
+        return _uuid(_seed("oracle", name.lower()))
+
+    def print_count(self, name):
+        key = name.lower()
+        seed = _seed("prints", key)
+        if key in BASIC_LANDS:
+            return 120 + seed % 60
+        if key in HEAVILY_REPRINTED:
+            return 40 + seed % 80
+        return 1 + seed % 6
+
+    def card(self, name, index=0, lang="en"):
+        key = name.lower()
+        seed = _seed("card", key)
+        oracle_id = self.oracle_id(name)
+        card_id = _uuid(_seed("print", key, str(index), lang))
+        if key in BASIC_LANDS:
+            type_line, mana_cost, cmc, colors = f"Basic Land — {name.title()}", "", 0, []
+            oracle_text = f"({{T}}: Add {{{BASIC_LANDS[key]}}}.)"
+        else:
+            type_line = TYPES[seed % len(TYPES)]
+            colors = sorted({COLORS[(seed >> shift) % 5] for shift in range(0, 8 * (1 + seed % 2), 8)})
+            generic = (seed >> 16) % 5
+            mana_cost = (f"{{{generic}}}" if generic else "") + "".join(f"{{{color}}}" for color in colors)
+            cmc = generic + len(colors)
+            keywords = [KEYWORDS[(seed >> shift) % len(KEYWORDS)] for shift in range(20, 20 + 6 * (seed % 3), 6)]
+            oracle_text = ", ".join(dict.fromkeys(keywords))
+            oracle_text += ("\n" if oracle_text else "") + \
+                "When this enters, draw a card. At the beginning of your upkeep, scry 1."
+        usd = f"{(seed % 4000) / 100 + 0.1:.2f}"
+        prices = {"usd": usd, "usd_foil": f"{float(usd) * 2:.2f}", "eur": None, "eur_foil": None}
+        if seed % 3:
+            # Alcune carte hanno solo i prezzi in dollari, per esercitare la conversione
+            prices["eur"] = f"{float(usd) * 0.9:.2f}"
+        card = {
+            "object": "card", "id": card_id, "oracle_id": oracle_id, "name": name, "lang": lang,
+            "released_at": f"{2024 - index % 30}-0{1 + index % 9}-15",
+            "set_name": f"Set {index}", "set": f"s{index:02d}", "collector_number": str(1 + index),
+            "mana_cost": mana_cost, "cmc": cmc, "type_line": type_line, "oracle_text": oracle_text,
+            "colors": colors, "artist": f"Artista {seed % 97}", "games": ["paper", "mtgo"] if index % 4 else ["paper"],
+            "prices": prices,
+            "image_uris": {variant: f"{self.base_url}/images/{card_id}/{variant}.jpg" for variant in IMAGE_SIZES},
+            "prints_search_uri": f"{self.base_url}/cards/search?order=released&q=oracleid%3A{oracle_id}"
+                                 f"&unique=prints",
+        }
+        if lang != "en":
+            card["printed_text"] = f"Testo stampato di {name} ({lang})."
+        return card
+
+    def has_translation(self, name):
+        return name.lower() in BASIC_LANDS or _seed("it", name.lower()) % 10 < 7
+
+
+class FakeScryfall:
+    """
+    Avvia il server in un thread. Le carte vengono registrate per oracle_id
+    quando sono richieste per nome, così che le ricerche per oracleid
+    possano rispondere. `advice_delay` simula la latenza del modello.
+    """
+
+    def __init__(self, port=0, advice_delay=0.0):
+        self.advice_delay = advice_delay
+        self._lock = threading.Lock()
+        self._names = {}  # oracle_id -> nome
+        self._images = {}  # url -> byte del JPEG
+        self.reset_stats()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.fixtures = Fixtures(self.base_url)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def env(self):
+        """Variabili d'ambiente che indirizzano il programma verso questo server."""
+        return {
+            "SCRYFALL_BASE_URL": self.base_url,
+            "EXCHANGE_RATE_URL": f"{self.base_url}/exchange?base=USD&symbols=EUR",
+            "ADVICE_API_URL": f"{self.base_url}/v1/chat/completions",
+            "OPENAI_API_KEY": "benchmark",
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"requests": 0, "bytes_sent": 0, "bytes_received": 0, "endpoints": {}}
+
+    def _count(self, endpoint, received, sent):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_sent"] += sent
+            self.stats["bytes_received"] += received
+            self.stats["endpoints"][endpoint] = self.stats["endpoints"].get(endpoint, 0) + 1
+
+    def _card(self, name, index=0, lang="en"):
+        card = self.fixtures.card(name, index, lang)
+        with self._lock:
+            self._names[card["oracle_id"]] = name
+        return card
+
+    def _image(self, path):
+        with self._lock:
+            data = self._images.get(path)
+        if data is None:
+            from PIL import Image
+            _, _, card_id, filename = path.split("/", 3)
+            variant = filename.rsplit(".", 1)[0]
+            size = IMAGE_SIZES.get(variant, IMAGE_SIZES["normal"])
+            seed = _seed("image", card_id)
+            # Rumore colorato: pesa come una vera scansione, non come un'immagine piatta
+            noise = Image.effect_noise(size, 40).convert("RGB")
+            tint = Image.new("RGB", size, (seed % 256, (seed >> 8) % 256, (seed >> 16) % 256))
+            buffer = io.BytesIO()
+            Image.blend(noise, tint, 0.6).save(buffer, "JPEG", quality=88)
+            data = buffer.getvalue()
+            with self._lock:
+                self._images[path] = data
+        return data
+
+    def _search(self, query):
+        query_lower = query.lower()
+        lang_filter = None
+        if " lang:" in query_lower:
+            query_lower, lang_filter = query_lower.rsplit(" lang:", 1)
+        oracle_ids = [part.split(":", 1)[1].strip("() ") for part in query_lower.split(" or ")
+                      if "oracleid:" in part]
+        with self._lock:
+            names = [self._names.get(oracle_id) for oracle_id in oracle_ids]
+        results = []
+        for name in filter(None, names):
+            if lang_filter:
+                if self.fixtures.has_translation(name):
+                    results.append(self._card(name, 0, lang_filter))
+            else:
+                results.extend(self._card(name, index) for index in range(self.fixtures.print_count(name)))
+        return results
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, endpoint, status, body, content_type="application/json", received=0):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                fake._count(endpoint, received, len(body))
+
+            def _not_found(self, endpoint, received=0):
+                self._send(endpoint, 404, {"object": "error", "code": "not_found", "status": 404}, received=received)
+
+            def do_GET(self):
+                url = urllib.parse.urlsplit(self.path)
+                params = dict(urllib.parse.parse_qsl(url.query))
+                if url.path == "/cards/named":
+                    name = params.get("exact", "")
+                    if not name:
+                        return self._not_found("named")
+                    return self._send("named", 200, fake._card(name, 0, params.get("lang", "en")))
+                if url.path == "/cards/search":
+                    query = params.get("q", "")
+                    endpoint = "search" if " lang:" in query else "prints"
+                    results = fake._search(query)
+                    if not results:
+                        return self._not_found(endpoint)
+                    page = int(params.get("page", 1))
+                    chunk = results[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+                    body = {"object": "list", "total_cards": len(results), "data": chunk,
+                            "has_more": page * PAGE_SIZE < len(results)}
+                    if body["has_more"]:
+                        next_params = dict(params, page=str(page + 1))
+                        body["next_page"] = f"{fake.base_url}{url.path}?{urllib.parse.urlencode(next_params)}"
+                    return self._send(endpoint, 200, body)
+                if url.path.startswith("/images/"):
+                    return self._send("images", 200, fake._image(url.path), content_type="image/jpeg")
+                if url.path == "/exchange":
+                    return self._send("exchange", 200, {"base": "USD", "rates": {"EUR": 0.92}})
+                self._not_found("other")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                url = urllib.parse.urlsplit(self.path)
+                if url.path == "/cards/collection":
+                    identifiers = json.loads(raw or b"{}").get("identifiers", [])
+                    if len(identifiers) > COLLECTION_LIMIT:
+                        return self._send("collection", 422, {"object": "error", "status": 422}, received=length)
+                    data = [fake._card(identifier["name"]) for identifier in identifiers if identifier.get("name")]
+                    # Le stampe precise (set e numero) non sono nelle fixture: come Scryfall, non trovate
+                    not_found = [identifier for identifier in identifiers if not identifier.get("name")]
+                    return self._send("collection", 200, {"object": "list", "not_found": not_found, "data": data},
+                                      received=length)
+                if url.path == "/v1/chat/completions":
+                    time.sleep(fake.advice_delay)
+                    return self._send("advice", 200, {"choices": [{"message": {"content": ADVICE}}]},
+                                      received=length)
+                self._not_found("other", received=length)
+
+        return Handler
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8790
+    fake = FakeScryfall(port).start()
+    for name, value in fake.env().items():
+        print(f"{name}={value}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
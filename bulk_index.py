@@ -0,0 +1,217 @@
+# bulk_index.py
+"""
+Indice locale costruito a partire da un file bulk di Scryfall (default_cards
+o all_cards), usato da scryfall_api quando OFFLINE_MODE è attivo.
+
+Importazione:
+    python bulk_index.py percorso/default-cards.json
+"""
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from config import BULK_INDEX_DB
+
+# Il file bulk è un unico array JSON: viene letto a blocchi di questa dimensione
+CHUNK_SIZE = 1 << 20
+INSERT_BATCH = 1000
+
+# Campi che nessun modulo usa: non vengono salvati per tenere l'indice compatto
+_UNUSED_FIELDS = ("legalities", "purchase_uris", "related_uris", "multiverse_ids", "all_parts",
+                  "mtgo_id", "mtgo_foil_id", "arena_id", "tcgplayer_id", "cardmarket_id")
+# Layout che non sono vere carte e non devono rispondere alle ricerche per nome
+_NON_CARD_LAYOUTS = ("token", "double_faced_token", "emblem", "art_series")
+
+_SEPARATORS = re.compile(r'[\s,]*')
+
+_conn = None
+_lock = threading.Lock()
+
+
+def iter_bulk_cards(path, chunk_size=CHUNK_SIZE):
+    """
+    Restituisce una alla volta le carte contenute nel file bulk, senza mai
+    caricare in memoria l'intero array.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size)
+        pos = _SEPARATORS.match(buffer).end()
+        if buffer[pos:pos + 1] != "[":
+            raise ValueError(f"Il file {path} non contiene un array JSON.")
+        pos += 1
+        eof = False
+        while True:
+            pos = _SEPARATORS.match(buffer, pos).end()
+            if buffer.startswith("]", pos):
+                return
+            try:
+                card, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Oggetto incompleto: serve un altro blocco del file
+                if eof:
+                    raise ValueError(f"Il file {path} è troncato o non valido.")
+                more = f.read(chunk_size)
+                eof = not more
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+            yield card
+
+
+def card_oracle_id(card):
+    oracle_id = card.get("oracle_id")
+    if not oracle_id and card.get("card_faces"):
+        oracle_id = card["card_faces"][0].get("oracle_id")
+    return oracle_id
+
+
+def card_printed_text(card):
+    printed_text = card.get("printed_text")
+    if printed_text is None and card.get("card_faces"):
+        printed_text = card["card_faces"][0].get("printed_text")
+    return printed_text
+
+
+def import_bulk_file(path, index_path=BULK_INDEX_DB):
+    """
+    Costruisce l'indice SQLite (nome esatto, nome in minuscolo, oracle_id,
+    (oracle_id, lingua) e (set, numero da collezionista)) dal file bulk. L'indice viene scritto su un file
+    temporaneo e sostituito solo a importazione completata.
+    """
+    tmp_path = index_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript("""
+        CREATE TABLE cards (
+            id TEXT PRIMARY KEY,
+            oracle_id TEXT,
+            lang TEXT NOT NULL,
+            released_at TEXT,
+            set_code TEXT,
+            collector_number TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE names (
+            name TEXT NOT NULL,
+            name_lower TEXT NOT NULL,
+            oracle_id TEXT NOT NULL
+        );
+    """)
+    cards_rows = []
+    names_rows = set()
+    count = 0
+    for card in iter_bulk_cards(path):
+        oracle_id = card_oracle_id(card)
+        for field in _UNUSED_FIELDS:
+            card.pop(field, None)
+        cards_rows.append((card["id"], oracle_id, card.get("lang", "en"), card.get("released_at"),
+                           card.get("set", "").lower(), card.get("collector_number"),
+                           json.dumps(card, separators=(",", ":"), ensure_ascii=False)))
+        if oracle_id and card.get("layout") not in _NON_CARD_LAYOUTS:
+            names = [card.get("name", "")] + [face.get("name", "") for face in card.get("card_faces", [])]
+            for name in names:
+                if name:
+                    names_rows.add((name, name.lower(), oracle_id))
+        if len(cards_rows) >= INSERT_BATCH:
+            conn.executemany("INSERT OR REPLACE INTO cards VALUES (?, ?, ?, ?, ?, ?, ?)", cards_rows)
+            count += len(cards_rows)
+            cards_rows = []
+    conn.executemany("INSERT OR REPLACE INTO cards VALUES (?, ?, ?, ?, ?, ?, ?)", cards_rows)
+    count += len(cards_rows)
+    conn.executemany("INSERT INTO names VALUES (?, ?, ?)", names_rows)
+    conn.executescript("""
+        CREATE INDEX names_name ON names (name);
+        CREATE INDEX names_name_lower ON names (name_lower);
+        CREATE INDEX cards_oracle_id_lang ON cards (oracle_id, lang, released_at);
+        CREATE INDEX cards_set_number ON cards (set_code, collector_number);
+    """)
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, index_path)
+    close_index()
+    print(f"Indice bulk creato: {count} carte in {index_path}")
+    return count
+
+
+def _get_connection():
+    global _conn
+    if _conn is None:
+        if not os.path.exists(BULK_INDEX_DB):
+            raise FileNotFoundError(
+                f"Indice bulk non trovato in {BULK_INDEX_DB}: importare prima un file con bulk_index.py")
+        _conn = sqlite3.connect(BULK_INDEX_DB, check_same_thread=False)
+    return _conn
+
+
+def close_index():
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+def _query(sql, params):
+    with _lock:
+        return _get_connection().execute(sql, params).fetchall()
+
+
+def _oracle_ids_for_name(card_name):
+    rows = _query("SELECT DISTINCT oracle_id FROM names WHERE name = ?", (card_name,))
+    if not rows:
+        rows = _query("SELECT DISTINCT oracle_id FROM names WHERE name_lower = ?", (card_name.lower(),))
+    return [row[0] for row in rows]
+
+
+def find_card(card_name, lang="en"):
+    """
+    Equivalente locale di /cards/named?exact=...: restituisce la stampa più
+    recente nella lingua richiesta, oppure None.
+    """
+    for oracle_id in _oracle_ids_for_name(card_name):
+        rows = _query("SELECT data FROM cards WHERE oracle_id = ? AND lang = ? ORDER BY released_at DESC LIMIT 1",
+                      (oracle_id, lang))
+        if rows:
+            return json.loads(rows[0][0])
+    return None
+
+
+def find_printings(oracle_id, lang="en"):
+    """Tutte le stampe della carta nella lingua indicata, dalla più recente."""
+    rows = _query("SELECT data FROM cards WHERE oracle_id = ? AND lang = ? ORDER BY released_at DESC",
+                  (oracle_id, lang))
+    return [json.loads(row[0]) for row in rows]
+
+
+def find_print(set_code, collector_number):
+    """
+    Equivalente locale di /cards/collection con set e numero da
+    collezionista: la stampa indicata (in inglese, se esiste anche in altre
+    lingue), oppure None. Gli indici creati prima che set e numero venissero
+    indicizzati vanno reimportati.
+    """
+    rows = _query("SELECT data FROM cards WHERE set_code = ? AND collector_number = ? ORDER BY lang != 'en' LIMIT 1",
+                  (set_code.lower(), collector_number))
+    return json.loads(rows[0][0]) if rows else None
+
+
+def find_translation(oracle_id, lang):
+    """
+    Restituisce (trovato, testo stampato) per la prima stampa della carta
+    nella lingua richiesta.
+    """
+    printings = find_printings(oracle_id, lang)
+    if not printings:
+        return False, None
+    return True, card_printed_text(printings[0])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Uso: python bulk_index.py <file bulk Scryfall .json>")
+        sys.exit(1)
+    import_bulk_file(sys.argv[1])
@@ -0,0 +1,54 @@
+# cancellation.py
+"""
+Annullamento cooperativo delle generazioni. Il segnale è un semplice
+threading.Event (parametro `cancelled` di create_pdf, degli helper di
+scryfall_api e del rate limiter): chi lo imposta chiede di fermarsi, e ogni
+attesa lunga (pause del limiter, backoff, Future di download e consigli)
+controlla l'evento almeno ogni POLL_INTERVAL secondi.
+"""
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+POLL_INTERVAL = 0.2
+
+
+class OperationCancelled(BaseException):
+    """
+    Sollevata quando l'evento di annullamento è impostato. Come
+    KeyboardInterrupt deriva da BaseException, così attraversa i tanti
+    `except Exception` che registrano un errore e proseguono con la carta
+    successiva.
+    """
+
+    def __init__(self, message="Operazione annullata dall'utente"):
+        super().__init__(message)
+
+
+def check(cancelled):
+    """Solleva OperationCancelled se `cancelled` (threading.Event o None) è impostato."""
+    if cancelled is not None and cancelled.is_set():
+        raise OperationCancelled()
+
+
+def sleep(seconds, cancelled=None):
+    """time.sleep che si interrompe subito, sollevando OperationCancelled, se `cancelled` viene impostato."""
+    if cancelled is None:
+        time.sleep(seconds)
+    elif cancelled.wait(seconds):
+        raise OperationCancelled()
+
+
+def result(future, cancelled=None):
+    """
+    future.result() che smette di attendere entro POLL_INTERVAL secondi
+    dall'annullamento. Il lavoro del Future non viene interrotto: se è già
+    in corso termina in background e il suo risultato viene ignorato.
+    """
+    if cancelled is None:
+        return future.result()
+    while True:
+        check(cancelled)
+        try:
+            return future.result(timeout=POLL_INTERVAL)
+        except FutureTimeoutError:
+            pass
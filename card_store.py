@@ -0,0 +1,199 @@
+# card_store.py
+import json
+import sqlite3
+import threading
+import time
+from config import CARD_CACHE_DB, CARD_TEXT_TTL, PRICE_TTL, PRINTS_TTL, MISSING_TTL, ADVICE_TTL, \
+    FRAGMENT_TTL
+
+_conn = None
+_lock = threading.Lock()
+_fragments_pruned = False
+
+
+def _get_connection():
+    global _conn
+    if _conn is None:
+        # Il timeout e il journal WAL permettono a più processi (es. batch.py)
+        # di condividere la stessa cache senza errori "database is locked"
+        _conn = sqlite3.connect(CARD_CACHE_DB, timeout=30, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cards (
+                name TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                oracle_id TEXT,
+                data TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (name, lang)
+            );
+            CREATE INDEX IF NOT EXISTS cards_oracle_id ON cards (oracle_id, lang);
+            CREATE TABLE IF NOT EXISTS translations (
+                oracle_id TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                printed_text TEXT,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (oracle_id, lang)
+            );
+            CREATE TABLE IF NOT EXISTS printings (
+                set_code TEXT NOT NULL,
+                collector_number TEXT NOT NULL,
+                data TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (set_code, collector_number)
+            );
+            CREATE TABLE IF NOT EXISTS prints (
+                oracle_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS exchange_rates (
+                pair TEXT PRIMARY KEY,
+                rate REAL NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS advice (
+                key TEXT PRIMARY KEY,
+                advice TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS fragments (
+                key TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+        """)
+    return _conn
+
+
+def _query_one(sql, params):
+    try:
+        with _lock:
+            return _get_connection().execute(sql, params).fetchone()
+    except sqlite3.Error as e:
+        print(f"Errore nella lettura della cache delle carte: {e}")
+        return None
+
+
+def _execute(sql, params):
+    try:
+        with _lock:
+            conn = _get_connection()
+            conn.execute(sql, params)
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"Errore nella scrittura della cache delle carte: {e}")
+
+
+def get_card(card_name, lang="en"):
+    """
+    Restituisce (dati, prezzi_aggiornati) per la carta salvata in cache.
+    Il testo oracle/stampato resta valido per CARD_TEXT_TTL secondi, i prezzi
+    solo per PRICE_TTL: se il testo è scaduto restituisce (None, False).
+    """
+    row = _query_one("SELECT data, fetched_at FROM cards WHERE name = ? AND lang = ?",
+                     (card_name.lower(), lang))
+    if not row:
+        return None, False
+    age = time.time() - row[1]
+    if age > CARD_TEXT_TTL:
+        return None, False
+    return json.loads(row[0]), age <= PRICE_TTL
+
+
+def put_card(card_name, lang, data):
+    _execute("INSERT OR REPLACE INTO cards (name, lang, oracle_id, data, fetched_at) VALUES (?, ?, ?, ?, ?)",
+             (card_name.lower(), lang, data.get("oracle_id"), json.dumps(data), time.time()))
+
+
+def get_printing(set_code, collector_number):
+    """Dati di una stampa precisa (set e numero da collezionista), se i prezzi non sono più vecchi di PRICE_TTL."""
+    row = _query_one("SELECT data, fetched_at FROM printings WHERE set_code = ? AND collector_number = ?",
+                     (set_code.lower(), collector_number))
+    if not row or time.time() - row[1] > PRICE_TTL:
+        return None
+    return json.loads(row[0])
+
+
+def put_printing(set_code, collector_number, data):
+    _execute("INSERT OR REPLACE INTO printings (set_code, collector_number, data, fetched_at) VALUES (?, ?, ?, ?)",
+             (set_code.lower(), collector_number, json.dumps(data), time.time()))
+
+
+def get_translation(oracle_id, lang):
+    """
+    Restituisce (trovato, testo) per la traduzione salvata in cache.
+    Una traduzione assente viene ricordata per MISSING_TTL secondi, così da
+    non ripetere la ricerca a ogni esecuzione.
+    """
+    row = _query_one("SELECT printed_text, fetched_at FROM translations WHERE oracle_id = ? AND lang = ?",
+                     (oracle_id, lang))
+    if not row:
+        return False, None
+    ttl = CARD_TEXT_TTL if row[0] is not None else MISSING_TTL
+    if time.time() - row[1] > ttl:
+        return False, None
+    return True, row[0]
+
+
+def put_translation(oracle_id, lang, printed_text):
+    _execute("INSERT OR REPLACE INTO translations (oracle_id, lang, printed_text, fetched_at) VALUES (?, ?, ?, ?)",
+             (oracle_id, lang, printed_text, time.time()))
+
+
+def get_prints(oracle_id):
+    row = _query_one("SELECT data, fetched_at FROM prints WHERE oracle_id = ?", (oracle_id,))
+    if not row or time.time() - row[1] > PRINTS_TTL:
+        return None
+    return json.loads(row[0])
+
+
+def put_prints(oracle_id, printings):
+    _execute("INSERT OR REPLACE INTO prints (oracle_id, data, fetched_at) VALUES (?, ?, ?)",
+             (oracle_id, json.dumps(printings), time.time()))
+
+
+def get_exchange_rate(pair):
+    """
+    Restituisce (tasso, istante del download) per la coppia di valute (es.
+    "USD_EUR"), anche se vecchio: è il chiamante a decidere se aggiornarlo.
+    """
+    row = _query_one("SELECT rate, fetched_at FROM exchange_rates WHERE pair = ?", (pair,))
+    return (row[0], row[1]) if row else None
+
+
+def put_exchange_rate(pair, rate):
+    _execute("INSERT OR REPLACE INTO exchange_rates (pair, rate, fetched_at) VALUES (?, ?, ?)",
+             (pair, rate, time.time()))
+
+
+def get_advice(key):
+    """Restituisce il consiglio salvato con la chiave indicata, se non più vecchio di ADVICE_TTL."""
+    row = _query_one("SELECT advice, fetched_at FROM advice WHERE key = ?", (key,))
+    if not row or time.time() - row[1] > ADVICE_TTL:
+        return None
+    return row[0]
+
+
+def put_advice(key, advice):
+    _execute("INSERT OR REPLACE INTO advice (key, advice, fetched_at) VALUES (?, ?, ?)",
+             (key, advice, time.time()))
+
+
+def get_fragment(key):
+    """Restituisce il frammento (sezione impaginata di una carta) salvato con la chiave indicata."""
+    row = _query_one("SELECT data, fetched_at FROM fragments WHERE key = ?", (key,))
+    if not row or time.time() - row[1] > FRAGMENT_TTL:
+        return None
+    return json.loads(row[0])
+
+
+def put_fragment(key, fragment):
+    global _fragments_pruned
+    if not _fragments_pruned:
+        # Le chiavi cambiano con i prezzi: i frammenti scaduti non verrebbero
+        # mai più letti, vengono rimossi alla prima scrittura di ogni processo
+        _fragments_pruned = True
+        _execute("DELETE FROM fragments WHERE fetched_at < ?", (time.time() - FRAGMENT_TTL,))
+    _execute("INSERT OR REPLACE INTO fragments (key, data, fetched_at) VALUES (?, ?, ?)",
+             (key, json.dumps(fragment), time.time()))
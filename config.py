@@ -9,22 +9,76 @@ load_dotenv(dotenv_path)
 # Directory di base e risorse
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
-CARD_IMAGES_DIR = os.path.join(ASSETS_DIR, 'card_images')
+# Cartella delle cache (immagini e metadati); MTG_CACHE_DIR permette di usarne
+# un'altra, es. una cartella vuota per i benchmark
+CACHE_DIR = os.getenv("MTG_CACHE_DIR", ASSETS_DIR)
+CARD_IMAGES_DIR = os.path.join(CACHE_DIR, 'card_images')
 FONTS_DIR = os.path.join(ASSETS_DIR, 'fonts')
 MANA_SYMBOLS_DIR = os.path.join(ASSETS_DIR, 'mana_symbols')
 
 # Crea la cartella delle immagini se non esiste
 os.makedirs(CARD_IMAGES_DIR, exist_ok=True)
+# Indice delle immagini già scaricate (chiave id Scryfall + variante -> file)
+IMAGE_MANIFEST = os.path.join(CARD_IMAGES_DIR, 'manifest.json')
 
 # API endpoints e costanti
-SCRYFALL_BASE_URL = "https://api.scryfall.com"
-EXCHANGE_RATE_URL = "https://api.exchangerate.host/latest?base=USD&symbols=EUR"
+# SCRYFALL_BASE_URL può essere sovrascritto (es. verso un server locale di prova)
+SCRYFALL_BASE_URL = os.getenv("SCRYFALL_BASE_URL", "https://api.scryfall.com")
+EXCHANGE_RATE_URL = os.getenv("EXCHANGE_RATE_URL", "https://api.exchangerate.host/latest?base=USD&symbols=EUR")
 
-# Impostazioni del rate limiter
-REQUEST_LIMIT = 200
-PAUSE_TIME = 60
-DELAY_BETWEEN = 0.1
+# Impostazioni del rate limiter (Scryfall chiede di restare sotto le 10 richieste al secondo)
+API_RATE_LIMIT = 10  # richieste al secondo a regime
+API_BURST = 10  # richieste consentite in raffica
 MAX_RETRIES = 3
+BACKOFF_BASE = 1  # secondi, raddoppiati a ogni tentativo (con jitter) su 5xx ed errori di connessione
+BACKOFF_MAX = 60
+# Timeout delle singole richieste alle API: una connessione bloccata diventa un
+# requests.Timeout, ritentato dal limiter, invece di un'attesa senza fine
+API_TIMEOUT = 10  # secondi
+
+# Numero di carte scaricate in parallelo (il rate limiter resta unico e condiviso)
+FETCH_WORKERS = 8
+# Carte al massimo in preparazione o pronte in attesa di essere disegnate nel PDF
+FETCH_QUEUE_SIZE = 2 * FETCH_WORKERS
+# Download paralleli dal CDN delle immagini, che non è soggetto al limite delle API
+IMAGE_WORKERS = 16
+# Risoluzione delle copie ridotte delle immagini incorporate nel PDF
+IMAGE_DPI = 150
+IMAGE_JPEG_QUALITY = 85
+
+# Filtri sulle versioni alternative mostrate nel PDF (None = nessun filtro).
+# PRINTINGS_LANG è un codice lingua di Scryfall (es. "it"): con una lingua
+# diversa da "en" l'elenco delle stampe include anche quelle non inglesi
+PRINTINGS_LANG = None
+PRINTINGS_PAPER_ONLY = False
+PRINTINGS_LIMIT = None
+
+# Numero massimo di identificatori per richiesta a /cards/collection
+COLLECTION_BATCH_SIZE = 75
+# Numero di oracle_id cercati insieme in un'unica ricerca delle traduzioni
+TRANSLATION_BATCH_SIZE = 20
+
+# Cache persistente dei metadati delle carte (SQLite) e relative scadenze in secondi
+CARD_CACHE_DB = os.path.join(CACHE_DIR, 'card_cache.sqlite')
+CARD_TEXT_TTL = 60 * 60 * 24 * 365  # testo oracle/stampato: praticamente permanente
+PRICE_TTL = 60 * 60 * 6  # i prezzi scadono dopo qualche ora
+PRINTS_TTL = 60 * 60 * 24  # l'elenco delle stampe include i prezzi di ciascuna versione
+FRAGMENT_TTL = PRINTS_TTL  # sezioni già impaginate del PDF: contengono i prezzi delle stampe
+MISSING_TTL = 60 * 60 * 24  # traduzioni non trovate
+EXCHANGE_RATE_TTL = 60 * 60 * 24  # oltre, il cambio salvato si usa ancora ma viene aggiornato in background
+
+# Modalità offline: i dati delle carte vengono letti dall'indice costruito con
+# bulk_index.py a partire da un file bulk di Scryfall invece che dalle API
+OFFLINE_MODE = os.getenv("MTG_OFFLINE_MODE", "0") == "1"
+BULK_INDEX_DB = os.path.join(ASSETS_DIR, 'bulk_index.sqlite')
+
+# Consigli sul mazzo: endpoint compatibile con le chat completions di OpenAI
+# (sovrascrivibile, es. verso un server locale di prova) e modello da usare
+ADVICE_API_URL = os.getenv("ADVICE_API_URL", "https://api.openai.com/v1/chat/completions")
+ADVICE_MODEL = os.getenv("ADVICE_MODEL", "gpt-4o-mini")
+ADVICE_TIMEOUT = 120  # secondi
+# I consigli già generati per lo stesso mazzo vengono riusati per questo tempo
+ADVICE_TTL = 60 * 60 * 24 * 30
 
 # Tasso di cambio di default
 DEFAULT_USD_TO_EUR = 0.92
@@ -36,6 +90,12 @@ BELEREN_BOLD_FONT = os.path.join(FONTS_DIR, 'Beleren-Bold.ttf')
 # Font di fallback
 DEFAULT_FONT_NAME = 'Helvetica'
 
-# Dimensioni della pagina (usando ReportLab; letter è una tuple)
-from reportlab.lib.pagesizes import letter
-PAGE_SIZE = letter
+# Dimensioni della pagina in punti: è il formato letter di ReportLab, scritto
+# qui come tuple per non caricare ReportLab a ogni import di config
+PAGE_SIZE = (612.0, 792.0)
+
+# Layout del PDF: "pages" impagina il mazzo su fogli PAGE_SIZE, "single" lo
+# disegna in un'unica pagina alta quanto serve (comportamento storico)
+PDF_LAYOUT = "pages"
+PAGE_MARGIN_TOP = 20
+PAGE_MARGIN_BOTTOM = 36
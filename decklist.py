@@ -0,0 +1,144 @@
+# decklist.py
+"""
+Lettura delle liste di carte incollate nella GUI o salvate su file: il
+formato semplice "N Nome" e le esportazioni di Arena e Moxfield, es.
+
+    Commander
+    1 Atraxa, Praetors' Voice (2X2) 190 *F*
+    Deck
+    1x Sol Ring (C21) 263
+    1 Fire // Ice
+    SIDEBOARD:
+    SB: 2 Swords to Plowshares
+
+Le righe vengono lette una alla volta (anche direttamente da un file aperto)
+e ogni carta diventa un dizionario con nome, quantità, set, numero da
+collezionista, foil e sezione. Ogni riga costa un tempo proporzionale alla
+sua lunghezza, quindi anche esportazioni di collezioni con decine di
+migliaia di righe si leggono in tempo lineare.
+"""
+import re
+
+# Intestazioni di sezione riconosciute (anche come "// Sideboard" o "SIDEBOARD:")
+SECTIONS = {
+    "deck": "main",
+    "main": "main",
+    "mainboard": "main",
+    "main deck": "main",
+    "commander": "commander",
+    "commanders": "commander",
+    "companion": "companion",
+    "sideboard": "sideboard",
+    "side": "sideboard",
+    "maybeboard": "maybeboard",
+    "considering": "maybeboard",
+    "tokens": "tokens",
+    "about": "about",  # intestazione di Arena: seguono nome e descrizione del mazzo, non carte
+}
+# Sezioni che non contengono carte da mettere nel PDF
+IGNORED_SECTIONS = {"about", "tokens"}
+# Sezioni che fanno parte del mazzo vero e proprio: sideboard e maybeboard
+# restano fuori dal PDF e dal conteggio delle carte usato per i consigli
+DECK_SECTIONS = {"main", "commander", "companion"}
+
+_QUANTITY = re.compile(r"(\d+)\s*[xX]?\s+")
+# " (C21) 263" in fondo alla riga; il numero da collezionista può contenere lettere e simboli (es. 12a, 263★)
+_PRINTING = re.compile(r"\s+[(\[]([A-Za-z0-9]{2,6})[)\]](?:\s+([^\s()\[\]]+))?$")
+_FINISH = re.compile(r"\s+\*([A-Za-z]{1,2})\*$")
+_SPLIT_NAME = re.compile(r"\s*//\s*")
+
+
+def _section_header(line):
+    """Sezione indicata dalla riga, o None se la riga non è un'intestazione."""
+    header = line[2:] if line.startswith("//") else line
+    return SECTIONS.get(header.strip().rstrip(":").strip().lower())
+
+
+def parse_line(line, section="main"):
+    """
+    Interpreta una riga con una carta e restituisce la sua voce, o None se
+    la riga è vuota o un commento. La quantità manca? Vale 1, come nella GUI.
+    """
+    line = line.strip()
+    if not line or line.startswith("#") or line.startswith("//"):
+        return None
+    if line[:3].upper() == "SB:":
+        section = "sideboard"
+        line = line[3:].lstrip()
+
+    quantity = 1
+    match = _QUANTITY.match(line)
+    if match:
+        quantity = int(match.group(1))
+        line = line[match.end():]
+
+    foil = False
+    match = _FINISH.search(line)
+    if match:
+        # *F* foil, *E* etched (Moxfield): entrambe finiture speciali
+        foil = match.group(1).upper() in ("F", "E")
+        line = line[:match.start()]
+
+    set_code = collector_number = None
+    match = _PRINTING.search(line)
+    if match:
+        set_code = match.group(1).lower()
+        collector_number = match.group(2)
+        line = line[:match.start()]
+
+    # "Fire//Ice" e "Fire // Ice" indicano la stessa carta a due facce
+    name = _SPLIT_NAME.sub(" // ", line.strip())
+    if not name:
+        return None
+    return {
+        "name": name,
+        "quantity": quantity,
+        "set": set_code,
+        "collector_number": collector_number,
+        "foil": foil,
+        "section": section,
+    }
+
+
+def iter_decklist(lines):
+    """
+    Restituisce una voce per ogni carta delle righe indicate (una stringa
+    con più righe, una lista o un file aperto), man mano che le legge.
+    Le intestazioni cambiano la sezione delle righe successive; le sezioni
+    in IGNORED_SECTIONS vengono saltate.
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+    section = "main"
+    for line in lines:
+        stripped = line.strip()
+        header = _section_header(stripped) if stripped else None
+        if header:
+            section = header
+            continue
+        if section in IGNORED_SECTIONS:
+            continue
+        entry = parse_line(stripped, section)
+        if entry:
+            yield entry
+
+
+def summarize(entries, sections=DECK_SECTIONS):
+    """
+    Raggruppa le voci delle sezioni indicate per nome, nell'ordine della
+    prima comparsa, e restituisce (nomi, ["N Nome" per i consigli],
+    {nome: quantità totale}, {nome: (set, numero da collezionista)}). Per
+    ogni nome vale la prima stampa esatta indicata nella lista.
+    """
+    card_counts = {}
+    printings = {}
+    for entry in entries:
+        if entry["section"] not in sections:
+            continue
+        name = entry["name"]
+        card_counts[name] = card_counts.get(name, 0) + entry["quantity"]
+        if entry["set"] and entry["collector_number"] and name not in printings:
+            printings[name] = (entry["set"], entry["collector_number"])
+    pdf_cards = list(card_counts)
+    ai_cards = [f"{count} {card}" for card, count in card_counts.items()]
+    return pdf_cards, ai_cards, card_counts, printings
@@ -1,10 +1,13 @@
 import os
+import queue
 import sys
 import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import subprocess
 
+import decklist
+from cancellation import OperationCancelled
 from pdf_generator import create_pdf, load_card_list_from_text
 import mec_prof  # Modulo per la generazione del contenuto delle meccaniche
 
@@ -27,7 +30,7 @@ class PDFGeneratorApp(tk.Tk):
         self.title("Magic Card Info Generator")
         self.geometry("625x850")
         self.resizable(True, True)
-        self.cancel_requested = False  # Flag per la cancellazione del processo
+        self.cancel_event = threading.Event()  # Segnale di annullamento della generazione in corso
         style = ttk.Style(self)
         style.theme_use("clam")
         self.create_widgets()
@@ -160,7 +163,8 @@ class PDFGeneratorApp(tk.Tk):
             messagebox.showerror("Errore", "Inserisci il nome della lista.")
             return
         text = self.text_input.get("1.0", tk.END)
-        pdf_cards, ai_cards, card_counts = load_card_list_from_text(text)
+        # Le liste esportate da Arena/Moxfield indicano anche set e numero della stampa
+        pdf_cards, ai_cards, card_counts, printings = decklist.summarize(decklist.iter_decklist(text))
         if not pdf_cards:
             messagebox.showerror("Errore", "Inserisci almeno una carta nell'elenco.")
             return
@@ -170,13 +174,14 @@ class PDFGeneratorApp(tk.Tk):
         os.makedirs(lista_dir, exist_ok=True)
         output_path = os.path.join(lista_dir, f"{list_name}.pdf")
 
-        # Imposto la flag di cancellazione a False
-        self.cancel_requested = False
+        # Ogni generazione ha il suo segnale: annullarla non tocca quelle successive
+        self.cancel_event = threading.Event()
+        self.progress = {"fetch": 0, "render": 0}
 
         # Crea il pop-up di avanzamento (modal)
         self.progress_popup = tk.Toplevel(self)
         self.progress_popup.title("Download in corso...")
-        self.progress_popup.geometry("300x100")
+        self.progress_popup.geometry("300x150")
         self.center_window(self.progress_popup)
         self.progress_popup.protocol("WM_DELETE_WINDOW", self.cancel_process)
         self.progress_popup.transient(self)
@@ -184,42 +189,52 @@ class PDFGeneratorApp(tk.Tk):
         self.progress_popup.focus_set()
         # Modifica del testo interno come richiesto
         self.popup_label = ttk.Label(self.progress_popup, text="...attendi qualche istante per favore\n mentre faccio una magia..")
-        self.popup_label.pack(pady=20)
+        self.popup_label.pack(pady=(20, 10))
+        ttk.Button(self.progress_popup, text="Annulla", command=self.cancel_process).pack()
 
         # Avvia il thread per la generazione del PDF
         gen_mode = self.gen_option.get()
         thread = threading.Thread(
             target=self.process_pdf,
             args=(pdf_cards, ai_cards, card_counts, output_path, gen_mode,
-                  self.lands_exclusion.get(), self.version_exclusion.get())
+                  self.lands_exclusion.get(), self.version_exclusion.get(), self.cancel_event, printings)
         )
         thread.start()
 
     def cancel_process(self):
-        # Quando l'utente clicca sulla X del pop-up, impostiamo la flag e chiudiamo il pop-up
-        self.cancel_requested = True
+        # Quando l'utente clicca sulla X del pop-up o su Annulla, create_pdf
+        # smette di scaricare e attendere entro un secondo circa
+        self.cancel_event.set()
         if hasattr(self, "progress_popup") and self.progress_popup.winfo_exists():
             self.progress_popup.destroy()
         messagebox.showinfo("Annullato", "Operazione annullata dall'utente.")
 
-    def update_progress(self, processed, total):
-        # Se l'utente ha richiesto la cancellazione, interrompiamo il processo
-        if self.cancel_requested:
-            raise Exception("Operazione annullata dall'utente")
-        percent = int((processed / total) * 100)
-        self.progress_popup.after(0, lambda: self.popup_label.config(text=f"...attendi qualche istante per favore\n mentre faccio una magia... {percent}%"))
+    def update_progress(self, processed, total, phase):
+        # Chiamata anche dai thread che scaricano: le fasi "fetch" (dati delle
+        # carte pronti) e "render" (carte disegnate) avanzano in parallelo
+        self.progress[phase] = int((processed / total) * 100)
+        text = (f"...attendi qualche istante per favore\n mentre faccio una magia...\n"
+                f"Dati delle carte: {self.progress['fetch']}%  PDF: {self.progress['render']}%")
 
-    def process_pdf(self, pdf_cards, ai_cards, card_counts, output_path, gen_mode, lands_exclusion, version_exclusion):
+        def show():
+            if self.progress_popup.winfo_exists():
+                self.popup_label.config(text=text)
+        self.progress_popup.after(0, show)
+
+    def process_pdf(self, pdf_cards, ai_cards, card_counts, output_path, gen_mode, lands_exclusion, version_exclusion,
+                    cancel_event, printings):
         try:
-            # Supponiamo che create_pdf richiami periodicamente progress_callback
             create_pdf(pdf_cards, ai_cards, card_counts, output_path, generation_mode=gen_mode,
                        lands_exclusion=lands_exclusion, version_exclusion=version_exclusion,
-                       progress_callback=self.update_progress)
+                       progress_callback=self.update_progress, cancelled=cancel_event, printings=printings)
             # Se il processo non è stato annullato, chiudiamo il pop-up e mostriamo il messaggio di successo
-            if not self.cancel_requested:
+            if not cancel_event.is_set():
                 self.progress_popup.after(0, self.progress_popup.destroy)
                 messagebox.showinfo("Fatto", f"PDF creato correttamente:\n{output_path}")
                 open_pdf(output_path)
+        except OperationCancelled:
+            # Il pop-up è già stato chiuso da cancel_process
+            pass
         except Exception as e:
             # In caso di errore o annullamento, chiudiamo il pop-up e mostriamo l'errore
             if hasattr(self, "progress_popup") and self.progress_popup.winfo_exists():
@@ -227,43 +242,105 @@ class PDFGeneratorApp(tk.Tk):
             messagebox.showerror("Errore", f"Si è verificato un errore: {e}")
 
     def show_mechanics(self):
-        # Ottieni il contenuto strutturato dal modulo mec_prof
-        results = mec_prof.generate_mechanics_content(self.text_input)
+        text = self.text_input.get("1.0", tk.END)
+        total = len(load_card_list_from_text(text)[0])
 
-        # Crea la finestra per mostrare il contenuto con uno stile migliorato
+        # La finestra si apre subito: i risultati vi arrivano una carta alla
+        # volta da un thread in background, senza bloccare l'interfaccia
         mech_window = tk.Toplevel(self)
         mech_window.title("Spiegazione Meccaniche")
         mech_window.geometry("600x400")
         self.center_window(mech_window)
-        self.grab_set()
-        self.focus_set()
+        mech_window.transient(self)
+        mech_window.focus_set()
         mech_window.configure(bg="#f0f0f0")  # Sfondo chiaro
 
         # Creazione di un frame interno con padding per una migliore estetica
         frame = ttk.Frame(mech_window, padding="10 10 10 10")
         frame.pack(fill=tk.BOTH, expand=True)
 
+        status_frame = ttk.Frame(frame)
+        status_frame.pack(fill=tk.X, pady=(0, 5))
+        status_label = ttk.Label(status_frame, text=f"Analisi in corso... 0/{total}")
+        status_label.pack(side=tk.LEFT)
+        cancel_button = ttk.Button(status_frame, text="Annulla")
+        cancel_button.pack(side=tk.RIGHT)
+
         st = scrolledtext.ScrolledText(frame, width=80, height=20, font=("Helvetica", 10))
         st.pack(fill=tk.BOTH, expand=True)
         st.tag_configure("bold", font=("Helvetica", 10, "bold"))
+        st.configure(state="disabled")
 
-        # Inserisci i dati per ogni carta con formattazione migliorata
-        for item in results:
-            st.insert(tk.END, "Carta:\n", "bold")
-            st.insert(tk.END, f"{item['card']}\n\n")
-
-            st.insert(tk.END, "Effetto:\n", "bold")
-            st.insert(tk.END, f"{item['oracle']}\n\n")
-
-            st.insert(tk.END, "Meccaniche individuate:\n", "bold")
-            if item['mechs']:
-                st.insert(tk.END, "\n\n".join(item['mechs']) + "\n")
+        cancelled = threading.Event()
+        results = queue.Queue()
+        done = object()  # segnala la fine dell'analisi nella coda
+
+        def analyze():
+            try:
+                for item in mec_prof.iter_mechanics_content(text, cancelled):
+                    results.put(item)
+            except OperationCancelled:
+                pass
+            except Exception as e:
+                results.put({"card": "Errore", "oracle": f"Si è verificato un errore: {e}", "mechs": []})
+            finally:
+                results.put(done)
+
+        def cancel():
+            cancelled.set()
+            cancel_button.configure(state="disabled")
+
+        def close():
+            cancelled.set()
+            mech_window.destroy()
+
+        def poll(shown=0):
+            # Gira sul thread di Tk: è l'unico che tocca i widget
+            if not mech_window.winfo_exists():
+                return
+            finished = False
+            st.configure(state="normal")
+            while True:
+                try:
+                    item = results.get_nowait()
+                except queue.Empty:
+                    break
+                if item is done:
+                    finished = True
+                    break
+                self.insert_mechanics(st, item)
+                shown += 1
+            st.configure(state="disabled")
+            if not finished:
+                status_label.configure(text=f"Analisi in corso... {shown}/{total}")
+                mech_window.after(100, poll, shown)
+            elif cancelled.is_set():
+                status_label.configure(text=f"Analisi annullata: {shown} carte su {total}.")
             else:
-                st.insert(tk.END, "Nessuna meccanica individuata.\n")
-
-            st.insert(tk.END, "-" * 50 + "\n\n")
-
-        st.configure(state="disabled")
+                status_label.configure(text=f"Analisi completata: {shown} carte.")
+            if finished:
+                cancel_button.configure(text="Chiudi", command=close, state="normal")
+
+        cancel_button.configure(command=cancel)
+        mech_window.protocol("WM_DELETE_WINDOW", close)
+        threading.Thread(target=analyze, daemon=True).start()
+        poll()
+
+    def insert_mechanics(self, st, item):
+        """Aggiunge al widget di testo la scheda di una carta."""
+        st.insert(tk.END, "Carta:\n", "bold")
+        st.insert(tk.END, f"{item['card']}\n\n")
+
+        st.insert(tk.END, "Effetto:\n", "bold")
+        st.insert(tk.END, f"{item['oracle']}\n\n")
+
+        st.insert(tk.END, "Meccaniche individuate:\n", "bold")
+        if item['mechs']:
+            st.insert(tk.END, "\n\n".join(item['mechs']) + "\n")
+        else:
+            st.insert(tk.END, "Nessuna meccanica individuata.\n")
+
+        st.insert(tk.END, "-" * 50 + "\n\n")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,265 @@
+# image_store.py
+import json
+import os
+import tempfile
+import threading
+import urllib.parse
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+import requests
+import cancellation
+import metrics
+from config import CARD_IMAGES_DIR, IMAGE_MANIFEST, IMAGE_WORKERS, IMAGE_DPI, IMAGE_JPEG_QUALITY
+
+# Le immagini arrivano dal CDN di Scryfall, che non è soggetto al limite delle
+# API: usano una sessione propria e non passano dal rate limiter.
+_session = requests.Session()
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=IMAGE_WORKERS))
+
+_executor = None
+_lock = threading.Lock()
+_manifest = None  # chiave -> nome del file in CARD_IMAGES_DIR (originali e derivate)
+_manifest_dirty = False
+_save_lock = threading.Lock()  # un solo salvataggio del manifest alla volta per processo
+_in_flight = {}  # chiave -> Future dei download in corso
+
+
+def image_key(card_data, variant):
+    """Chiave della cache: id Scryfall della stampa + variante (normal, small, ...)."""
+    card_id = card_data.get("id") or urllib.parse.quote(card_data.get("name", "unknown"))
+    return f"{card_id}_{variant}"
+
+
+def image_url(card_data, variant):
+    image_uris = card_data.get("image_uris")
+    if not image_uris and card_data.get("card_faces"):
+        # Carte a doppia faccia: si usa l'immagine del fronte
+        image_uris = card_data["card_faces"][0].get("image_uris")
+    return (image_uris or {}).get(variant)
+
+
+def _load_manifest():
+    """
+    Carica il manifest una sola volta; le voci i cui file non esistono più
+    vengono scartate con un'unica lettura della cartella.
+    """
+    global _manifest
+    if _manifest is None:
+        manifest = {}
+        try:
+            with open(IMAGE_MANIFEST, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            pass
+        existing = set(os.listdir(CARD_IMAGES_DIR))
+        _manifest = {key: filename for key, filename in manifest.items() if filename in existing}
+    return _manifest
+
+
+def _atomic_write(path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def _manifest_file_lock():
+    """Lock esclusivo fra processi (es. quelli di batch.py) sul file accanto al manifest."""
+    with open(IMAGE_MANIFEST + ".lock", "a+b") as f:
+        try:
+            import fcntl
+        except ImportError:  # Windows
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def save_manifest():
+    """Salva su disco le voci nuove del manifest, se ce ne sono."""
+    global _manifest_dirty
+    with _lock:
+        if not _manifest_dirty:
+            return
+        manifest = dict(_manifest)
+        _manifest_dirty = False
+    try:
+        with _save_lock, _manifest_file_lock():
+            # Altri processi possono aver aggiunto voci nel frattempo: si
+            # fondono con le nostre, rileggendo il file sotto il lock
+            try:
+                with open(IMAGE_MANIFEST, "r", encoding="utf-8") as f:
+                    manifest = {**json.load(f), **manifest}
+            except (OSError, ValueError):
+                pass
+            data = json.dumps(manifest).encode("utf-8")
+            _atomic_write(IMAGE_MANIFEST, lambda f: f.write(data))
+    except OSError as e:
+        print(f"Errore nel salvataggio del manifest delle immagini: {e}")
+        with _lock:
+            _manifest_dirty = True  # si riprova al prossimo salvataggio
+
+
+def _download(key, url):
+    global _manifest_dirty
+    filename = f"{key}.jpg"
+    path = os.path.join(CARD_IMAGES_DIR, filename)
+
+    def write_body(f):
+        size = 0
+        for chunk in response.iter_content(64 * 1024):
+            f.write(chunk)
+            size += len(chunk)
+        metrics.http("images", size)
+
+    try:
+        # Un altro processo che condivide la cartella può averla appena scaricata
+        if not os.path.exists(path):
+            with metrics.span("download_image"), _session.get(url, stream=True, timeout=30) as response:
+                response.raise_for_status()
+                # Scrittura su file temporaneo + rename: un download interrotto
+                # non lascia mai un JPEG troncato al posto di quello vero
+                _atomic_write(path, write_body)
+    except Exception as e:
+        print(f"Errore nel download dell'immagine da {url}: {e}")
+        path = None
+    with _lock:
+        if path:
+            _manifest[key] = filename
+            _manifest_dirty = True
+        _in_flight.pop(key, None)
+    return path
+
+
+def _lookup_or_submit(card_data, variant):
+    """
+    Restituisce il percorso dell'immagine se è già in cache, altrimenti il
+    Future del suo download (avviandolo, o riusando quello già in corso).
+    """
+    global _executor
+    key = image_key(card_data, variant)
+    with _lock:
+        filename = _load_manifest().get(key)
+        if filename:
+            metrics.cache("images", "disk")
+            return os.path.join(CARD_IMAGES_DIR, filename)
+        future = _in_flight.get(key)
+        if future is not None:
+            metrics.cache("images", "memory")
+        else:
+            url = image_url(card_data, variant)
+            if not url:
+                return None
+            metrics.cache("images", "miss")
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS)
+            future = _in_flight[key] = _executor.submit(_download, key, url)
+    return future
+
+
+def prefetch_images(items, cancelled=None):
+    """
+    Scarica in parallelo le immagini richieste come coppie (dati carta, variante)
+    e restituisce la lista dei percorsi locali nello stesso ordine (None per le
+    immagini non disponibili). Se `cancelled` (threading.Event) viene
+    impostato smette di attendere con cancellation.OperationCancelled: i
+    download richiesti non ancora avviati vengono scartati, quelli già in
+    corso terminano comunque e finiscono in cache.
+    """
+    results = [_lookup_or_submit(card_data, variant) for card_data, variant in items]
+    try:
+        paths = [_wait(result, cancelled) for result in results]
+    except cancellation.OperationCancelled:
+        _discard(results)
+        raise
+    save_manifest()
+    return paths
+
+
+def _wait(result, cancelled):
+    if not hasattr(result, "result"):
+        return result
+    try:
+        return cancellation.result(result, cancelled)
+    except CancelledError:
+        # Download scartato da una generazione annullata che lo aveva richiesto
+        return None
+
+
+def _discard(results):
+    """Annulla i download fra `results` che non sono ancora partiti."""
+    futures = {id(result) for result in results if hasattr(result, "result")}
+    with _lock:
+        for key, future in list(_in_flight.items()):
+            if id(future) in futures and future.cancel():
+                del _in_flight[key]
+
+
+def is_cached(path):
+    """
+    Indica se il file (un originale o una copia ridotta) è nella cache, dal
+    manifest in memoria e senza accedere al disco.
+    """
+    directory, filename = os.path.split(path)
+    if os.path.normcase(os.path.abspath(directory)) != os.path.normcase(os.path.abspath(CARD_IMAGES_DIR)):
+        return False
+    with _lock:
+        manifest = _load_manifest()
+        # Le copie ridotte hanno come chiave il nome del file, gli originali "chiave.jpg"
+        return filename in (manifest.get(filename), manifest.get(os.path.splitext(filename)[0]))
+
+
+def get_image(card_data, variant="normal"):
+    return prefetch_images([(card_data, variant)])[0]
+
+
+def get_derivative(path, width, height, dpi=IMAGE_DPI):
+    """
+    Restituisce una copia dell'immagine ridotta per essere disegnata in un
+    riquadro di width x height punti a `dpi` punti per pollice, creandola
+    accanto all'originale la prima volta. In caso di errore restituisce
+    l'originale. Le nuove copie entrano nel manifest in memoria: chi le crea
+    chiama poi save_manifest().
+    """
+    global _manifest_dirty
+    if not path:
+        return None
+    base, _ = os.path.splitext(os.path.basename(path))
+    filename = f"{base}_{int(width)}x{int(height)}@{dpi}.jpg"
+    with _lock:
+        if _load_manifest().get(filename):
+            metrics.cache("derivatives", "disk")
+            return os.path.join(CARD_IMAGES_DIR, filename)
+    metrics.cache("derivatives", "miss")
+    from PIL import Image
+    target = (max(1, round(width * dpi / 72)), max(1, round(height * dpi / 72)))
+    derivative_path = os.path.join(CARD_IMAGES_DIR, filename)
+    try:
+        with metrics.span("derivative"), Image.open(path) as img:
+            # draft() permette al decoder JPEG di ridurre l'immagine già in lettura
+            img.draft("RGB", target)
+            img = img.convert("RGB")
+            img.thumbnail(target, Image.LANCZOS)
+            _atomic_write(derivative_path, lambda f: img.save(f, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True))
+    except Exception as e:
+        print(f"Errore nella creazione dell'immagine ridotta per {path}: {e}")
+        return path
+    with _lock:
+        _manifest[filename] = filename
+        _manifest_dirty = True
+    return derivative_path
@@ -0,0 +1,86 @@
+# mana_symbols.py
+import hashlib
+import os
+import re
+import threading
+from config import MANA_SYMBOLS_DIR, CRIMSON_FONT
+
+# Lato in pixel delle immagini generate per i simboli senza file
+TEXT_SYMBOL_SIZE = 64
+
+_symbols = None  # nome del simbolo (es. "WU") -> (hash, ImageReader) pronto da disegnare
+_lock = threading.Lock()
+
+
+def parse_mana_cost(mana_cost):
+    """Restituisce i simboli di un costo di mana, es. "{2}{W/U}" -> ["2", "W/U"]."""
+    return re.findall(r'\{([^}]+)\}', mana_cost)
+
+
+def _normalize(symbol):
+    # Scryfall scrive ibridi e phyrexiani con la barra ({W/U}, {B/R/P}), i file no (WU.png, BRP.png)
+    return symbol.replace("/", "").upper()
+
+
+def _to_reader(img):
+    from reportlab.lib.utils import ImageReader
+    digest = hashlib.sha1(img.tobytes()).hexdigest()
+    return digest, ImageReader(img)
+
+
+def _flatten(image_path):
+    from PIL import Image
+    with Image.open(image_path) as img:
+        img = img.convert("RGBA")
+    background = Image.new("RGBA", img.size, (255, 255, 255, 255))
+    return _to_reader(Image.alpha_composite(background, img).convert("RGB"))
+
+
+def _render_text_symbol(symbol):
+    """Disegna un simbolo senza file (es. {U/P}, {T}, {15}) come testo in un cerchio grigio."""
+    from PIL import Image, ImageDraw, ImageFont
+    size = TEXT_SYMBOL_SIZE
+    img = Image.new("RGB", (size, size), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((1, 1, size - 2, size - 2), fill=(204, 194, 192))
+    font_size = size // 2 if len(symbol) <= 2 else size // 3
+    try:
+        font = ImageFont.truetype(CRIMSON_FONT, font_size)
+    except OSError:
+        font = ImageFont.load_default()
+    draw.text((size / 2, size / 2), symbol, fill=(0, 0, 0), font=font, anchor="mm")
+    return _to_reader(img)
+
+
+def _load_symbols():
+    """Carica e compone su fondo bianco tutti i simboli della cartella, una volta sola."""
+    global _symbols
+    with _lock:
+        if _symbols is None:
+            symbols = {}
+            for filename in os.listdir(MANA_SYMBOLS_DIR):
+                name, ext = os.path.splitext(filename)
+                if ext.lower() != ".png":
+                    continue
+                try:
+                    symbols[name.upper()] = _flatten(os.path.join(MANA_SYMBOLS_DIR, filename))
+                except Exception as e:
+                    print(f"Errore nel caricamento del simbolo mana {filename}: {e}")
+            _symbols = symbols
+    return _symbols
+
+
+def get_symbol(symbol):
+    """
+    Restituisce (hash, ImageReader) del simbolo, già composto su fondo
+    bianco. I simboli senza un file corrispondente vengono resi come testo
+    e conservati per gli usi successivi.
+    """
+    symbols = _load_symbols()
+    key = _normalize(symbol)
+    entry = symbols.get(key)
+    if entry is None:
+        entry = _render_text_symbol(symbol)
+        with _lock:
+            entry = symbols.setdefault(key, entry)
+    return entry
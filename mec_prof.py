@@ -1,52 +1,73 @@
 # mec_prof.py
-import os
-import json
-import re
+import cancellation
+import mechanics
+import metrics
 from pdf_generator import load_card_list_from_text
-from scryfall_api import fetch_card_data
+from scryfall_api import resolve_card, resolve_cards
+from config import COLLECTION_BATCH_SIZE
 
 
-def generate_mechanics_content(text_input):
+def iter_mechanics_content(text, cancelled=None):
     """
-    Legge l'elenco delle carte dal widget di testo e restituisce una lista
-    di dizionari con i dati:
-      - 'card': nome della carta
-      - 'oracle': descrizione in inglese (oracle_text)
-      - 'mechs': lista di stringhe per ogni meccanica individuata con la relativa spiegazione
+    Versione incrementale di generate_mechanics_content: restituisce il
+    dizionario di ogni carta (stessi campi) appena i suoi dati sono
+    disponibili. Le carte vengono risolte un blocco di /cards/collection
+    alla volta, così le prime sono pronte senza attendere tutto l'elenco;
+    quelle già in memoria (es. dopo aver generato il PDF della stessa lista)
+    o nella cache su disco non richiedono alcuna chiamata.
+    `cancelled`, se indicato, è un threading.Event: quando viene impostato
+    l'analisi si ferma con cancellation.OperationCancelled prima della carta
+    successiva, o subito se sta aspettando il rate limiter.
     """
-    text = text_input.get("1.0", "end")
     pdf_cards, _, _ = load_card_list_from_text(text)
     if not pdf_cards:
-        return []
+        return
 
-    # Carica il vocabolario delle meccaniche da data/vocab_wiki.json
-    vocab_path = os.path.join(os.path.dirname(__file__), "data", "vocab_wiki.json")
+    # Vocabolario delle meccaniche (data/vocab_wiki.json), caricato e compilato una volta sola
     try:
-        with open(vocab_path, "r", encoding="utf-8") as f:
-            vocab = json.load(f)
+        matcher = mechanics.get_matcher()
     except Exception as e:
-        return [{"card": "Errore", "oracle": f"Errore nel caricamento del vocabolario: {e}", "mechs": []}]
+        yield {"card": "Errore", "oracle": f"Errore nel caricamento del vocabolario: {e}", "mechs": []}
+        return
+
+    for start in range(0, len(pdf_cards), COLLECTION_BATCH_SIZE):
+        batch = pdf_cards[start:start + COLLECTION_BATCH_SIZE]
+        with metrics.span("resolve"):
+            resolved, not_found = resolve_cards(batch, with_prices=False, cancelled=cancelled)
+        not_found = set(not_found)
+
+        for card in batch:
+            cancellation.check(cancelled)
+            card_data = resolved.get(card)
+            if card_data is None and card not in not_found:
+                # Le carte di un blocco fallito vengono ritentate una alla volta
+                card_data = resolve_card(card, lang="en", with_prices=False, cancelled=cancelled)
+            if not card_data:
+                yield {
+                    "card": card,
+                    "oracle": "Dati non trovati.",
+                    "mechs": []
+                }
+                continue
 
-    results = []
-    for card in pdf_cards:
-        card_data = fetch_card_data(card, lang="en")
-        if not card_data:
-            results.append({
+            oracle_text = card_data.get("oracle_text", "Nessuna descrizione disponibile")
+            with metrics.span("mechanics", card=card):
+                mechs = [f"{mech}: {matcher.describe(mech)}" for mech in matcher.find(oracle_text)]
+
+            yield {
                 "card": card,
-                "oracle": "Dati non trovati.",
-                "mechs": []
-            })
-            continue
-
-        oracle_text = card_data.get("oracle_text", "Nessuna descrizione disponibile")
-        mechs = []
-        for mech, description in vocab.items():
-            if re.search(r'\b' + re.escape(mech) + r'\b', oracle_text, re.IGNORECASE):
-                mechs.append(f"{mech}: {description}")
-
-        results.append({
-            "card": card,
-            "oracle": oracle_text,
-            "mechs": mechs
-        })
-    return results
+                "oracle": oracle_text,
+                "mechs": mechs
+            }
+
+
+def generate_mechanics_content(text_input):
+    """
+    Legge l'elenco delle carte dal widget di testo e restituisce una lista
+    di dizionari con i dati:
+      - 'card': nome della carta
+      - 'oracle': descrizione in inglese (oracle_text)
+      - 'mechs': lista di stringhe per ogni meccanica individuata con la relativa spiegazione
+    """
+    metrics.reset()
+    return list(iter_mechanics_content(text_input.get("1.0", "end")))
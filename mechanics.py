@@ -0,0 +1,83 @@
+# mechanics.py
+import json
+import os
+import re
+import threading
+
+VOCAB_PATH = os.path.join(os.path.dirname(__file__), "data", "vocab_wiki.json")
+
+_matcher = None
+_lock = threading.Lock()
+
+
+def _trie_regex(words):
+    """
+    Costruisce un'alternativa regex equivalente a "parola1|parola2|..." ma
+    organizzata ad albero sui prefissi comuni, così che ad ogni posizione il
+    motore provi solo le voci compatibili con i caratteri già letti.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        optional = "" in node
+        if not branches:
+            return ""
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")" + ("?" if optional else "")
+
+    return build(trie)
+
+
+class MechanicsMatcher:
+    """
+    Riconosce in un solo passaggio tutte le meccaniche del vocabolario
+    presenti in un testo: le voci sono compilate in un'unica espressione
+    regolare (alternativa ad albero fra tutte, con i confini di parola),
+    invece di una ricerca separata per ogni voce.
+    """
+
+    def __init__(self, vocab):
+        self.vocab = vocab
+        self._order = {mechanic: index for index, mechanic in enumerate(vocab)}
+        self._by_lower = {mechanic.lower(): mechanic for mechanic in vocab}
+        if vocab:
+            # Il lookahead fa sì che anche corrispondenze sovrapposte vengano trovate tutte
+            alternatives = _trie_regex(self._by_lower)
+            self._pattern = re.compile(r'\b(?=(' + alternatives + r')\b)', re.IGNORECASE)
+        else:
+            self._pattern = None
+
+    def find(self, text):
+        """Meccaniche presenti nel testo, nell'ordine del vocabolario."""
+        if not self._pattern or not text:
+            return []
+        found = {self._by_lower[match.group(1).lower()] for match in self._pattern.finditer(text)}
+        return sorted(found, key=self._order.__getitem__)
+
+    def describe(self, mechanic):
+        return self.vocab.get(mechanic, "Descrizione non disponibile")
+
+
+def load_vocabulary(path=VOCAB_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def get_matcher():
+    """
+    Restituisce il riconoscitore condiviso, caricando e compilando il
+    vocabolario alla prima chiamata. Gli errori di caricamento vengono
+    propagati e il caricamento verrà ritentato alla chiamata successiva.
+    """
+    global _matcher
+    with _lock:
+        if _matcher is None:
+            _matcher = MechanicsMatcher(load_vocabulary())
+    return _matcher
@@ -0,0 +1,146 @@
+# metrics.py
+"""
+Strumentazione condivisa da scryfall_api, image_store, pdf_generator e
+mec_prof: tempi per fase e per carta, richieste HTTP per endpoint con i
+byte scaricati, esiti delle cache e un report in JSON. I dati sono globali
+al processo e vengono azzerati da reset() all'inizio di ogni generazione.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_stages = {}  # fase -> [numero di chiamate, secondi]
+_cards = {}  # carta -> {fase: secondi}
+_http = {}  # endpoint -> [richieste, byte]
+_caches = {}  # cache -> {esito: numero}
+
+
+def reset():
+    with _lock:
+        for data in (_stages, _cards, _http, _caches):
+            data.clear()
+
+
+def add_time(stage, seconds, card=None):
+    with _lock:
+        entry = _stages.setdefault(stage, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        if card is not None:
+            per_card = _cards.setdefault(card, {})
+            per_card[stage] = per_card.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage, card=None):
+    """Misura il blocco come una chiamata della fase `stage` (e della carta, se indicata)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(stage, time.perf_counter() - start, card)
+
+
+def timed(iterable, stage):
+    """Restituisce gli elementi di `iterable` misurando come `stage` l'attesa di ciascuno."""
+    iterator = iter(iterable)
+    while True:
+        with span(stage):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def http(endpoint, size):
+    """Registra una richiesta HTTP completata verso `endpoint` e i byte ricevuti."""
+    with _lock:
+        entry = _http.setdefault(endpoint, [0, 0])
+        entry[0] += 1
+        entry[1] += size
+
+
+def cache(name, outcome):
+    """Registra l'esito di una ricerca nella cache `name`: "memory", "disk" o "miss"."""
+    with _lock:
+        outcomes = _caches.setdefault(name, {})
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+
+def report():
+    """Fotografia dei dati raccolti dall'ultimo reset(), pronta per json.dumps."""
+    with _lock:
+        caches = {}
+        for name, outcomes in _caches.items():
+            total = sum(outcomes.values())
+            caches[name] = dict(outcomes, hit_ratio=round(1 - outcomes.get("miss", 0) / total, 3))
+        return {
+            "stages": {stage: {"calls": calls, "seconds": round(seconds, 4)}
+                       for stage, (calls, seconds) in sorted(_stages.items())},
+            "cards": {card: {stage: round(seconds, 4) for stage, seconds in stages.items()}
+                      for card, stages in _cards.items()},
+            "http": {
+                "requests": sum(requests for requests, _ in _http.values()),
+                "bytes": sum(size for _, size in _http.values()),
+                "endpoints": {endpoint: {"requests": requests, "bytes": size}
+                              for endpoint, (requests, size) in sorted(_http.items())},
+            },
+            "caches": caches,
+        }
+
+
+def save_report(data, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+@contextmanager
+def capture(mode=None, profile_path=None):
+    """
+    Profilazione opzionale del blocco; il riassunto finisce nel dizionario
+    restituito. mode="cpu" usa cProfile (solo il thread chiamante: disegno e
+    attese, non i thread che scaricano) e, con profile_path, salva il profilo
+    completo per pstats/snakeviz; mode="memory" usa tracemalloc (tutti i
+    thread) e riporta il picco e le righe che allocano di più.
+    """
+    result = {}
+    if mode is None:
+        yield result
+    elif mode == "cpu":
+        import cProfile
+        import io
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            if profile_path:
+                profiler.dump_stats(profile_path)
+                result["profile_path"] = profile_path
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(25)
+            result["cpu"] = stream.getvalue()
+    elif mode == "memory":
+        import tracemalloc
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(10)
+        try:
+            yield result
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if started:
+                tracemalloc.stop()
+            result["memory"] = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top": [str(stat) for stat in snapshot.statistics("lineno")[:15]],
+            }
+    else:
+        raise ValueError(f"Modalità di profilazione sconosciuta: {mode}")
@@ -1,36 +1,64 @@
 # pdf_generator.py
 import os
+import hashlib
+import json
 import math
 import re
-from collections import OrderedDict
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-from reportlab.platypus import Paragraph
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from itertools import islice
+
+import cancellation
+import card_store
+import decklist
+import image_store
+import mana_symbols
+import mechanics
+import metrics
+from pdf_images import get_registry
 from scryfall_api import (
-    fetch_card_data, download_card_image, get_card_text_in_italian, get_card_price,
-    download_printing_image_small
+    resolve_card, resolve_cards, resolve_printings, fetch_translations, format_card_price,
+    printing_image_variant, get_card_printings, get_usd_to_eur_rate, clear_resolved_cards, limiter
 )
-from config import DEFAULT_FONT_NAME, CRIMSON_FONT, BELEREN_BOLD_FONT, PAGE_SIZE, MANA_SYMBOLS_DIR
-
-# Registrazione dei font
-try:
-    pdfmetrics.registerFont(TTFont('Crimson', CRIMSON_FONT))
-    FONT_NAME = 'Crimson'
-except Exception as e:
-    print("Impossibile caricare il font Crimson, uso Helvetica.")
-    FONT_NAME = DEFAULT_FONT_NAME
-
-try:
-    pdfmetrics.registerFont(TTFont('Beleren-Bold', BELEREN_BOLD_FONT))
-    FONT_BOLD = 'Beleren-Bold'
-except Exception as e:
-    print("Impossibile caricare il font Beleren-Bold, uso il font normale per i titoli.")
-    FONT_BOLD = FONT_NAME
+from config import DEFAULT_FONT_NAME, CRIMSON_FONT, BELEREN_BOLD_FONT, PAGE_SIZE, FETCH_WORKERS, \
+    FETCH_QUEUE_SIZE, ADVICE_API_URL, ADVICE_MODEL, ADVICE_TIMEOUT, PRINTINGS_LANG, PRINTINGS_PAPER_ONLY, \
+    PRINTINGS_LIMIT, PDF_LAYOUT, PAGE_MARGIN_TOP, PAGE_MARGIN_BOTTOM
+
+# ReportLab e i font servono solo per disegnare: vengono caricati alla prima
+# generazione di un PDF, non all'import (che resta veloce per la GUI)
+FONT_NAME = DEFAULT_FONT_NAME
+FONT_BOLD = DEFAULT_FONT_NAME
+_fonts_registered = False
+_fonts_lock = threading.Lock()
+
+def register_fonts():
+    """Registra i font TrueType in ReportLab, una sola volta per processo."""
+    global FONT_NAME, FONT_BOLD, _fonts_registered
+    with _fonts_lock:
+        if _fonts_registered:
+            return
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        try:
+            pdfmetrics.registerFont(TTFont('Crimson', CRIMSON_FONT))
+            FONT_NAME = 'Crimson'
+        except Exception as e:
+            print("Impossibile caricare il font Crimson, uso Helvetica.")
+            FONT_NAME = DEFAULT_FONT_NAME
+
+        try:
+            pdfmetrics.registerFont(TTFont('Beleren-Bold', BELEREN_BOLD_FONT))
+            FONT_BOLD = 'Beleren-Bold'
+        except Exception as e:
+            print("Impossibile caricare il font Beleren-Bold, uso il font normale per i titoli.")
+            FONT_BOLD = FONT_NAME
+        _fonts_registered = True
+
+# Dimensioni (in punti) dell'immagine principale e delle miniature delle stampe
+MAIN_IMG_SIZE = (200, 280)
+GRID_IMG_SIZE = (90, 110)
 
 def simple_markdown_to_rl(text):
     """
@@ -81,14 +109,14 @@ def simple_markdown_to_rl(text):
 
 def generate_targeted_advice(num_cards, total_price, avg_price, avg_cmc, cards_list, deck_colors):
     """
-    Genera un consiglio mirato utilizzando le API di OpenAI.
+    Genera un consiglio mirato utilizzando le API di OpenAI (o l'endpoint
+    compatibile in ADVICE_API_URL). Le risposte vengono salvate in cache con
+    una chiave derivata da modello e prompt: lo stesso mazzo non richiede una
+    nuova chiamata finché il consiglio non scade.
     """
     import os
     import requests
     try:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise Exception("OPENAI_API_KEY non impostata.")
         prompt = (
             f"""<reasoning> - Simple Change: no - Reasoning: yes - Identify: "istruzioni richiedono chain-of-thought all'inizio" - Conclusion: yes - Ordering: before - Structure: yes - Examples: no - Complexity: 5 - Task: 5 - Necessity: 5 - Specificity: 5 - Prioritization: reasoning clarity, structure, detail - Conclusion: Enhance clarity and detail by explicitly requiring initial reasoning, maintaining structured instructions, and providing detailed steps and output format. </reasoning> Analizza un mazzo Magic Commander basandoti sui seguenti parametri:
 - Elenco delle carte: {', '.join(cards_list)}
@@ -114,19 +142,31 @@ Se {num_cards} è invece inferiore a 100, che è il numero di carte necessarie p
 Non iniziare la risposta elencando l'elenco delle carte o Numero totale di carte o Costo medio in mana (CMC) o Colori del mazzo.
 """
         )
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
         data = {
-            "model": "gpt-4o-mini",
+            "model": ADVICE_MODEL,
             "messages": [{"role": "user", "content": prompt}],
             "temperature": 0.7
         }
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=data)
+        # Il prompt contiene già tutti i dati del mazzo usati dal modello
+        cache_key = hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+        advice = card_store.get_advice(cache_key)
+        metrics.cache("advice", "miss" if advice is None else "disk")
+        if advice is not None:
+            return advice
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise Exception("OPENAI_API_KEY non impostata.")
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        with metrics.span("advice"):
+            response = requests.post(ADVICE_API_URL, headers=headers, json=data, timeout=ADVICE_TIMEOUT)
+        metrics.http("advice", len(response.content))
         response.raise_for_status()
         result = response.json()
         advice = result["choices"][0]["message"]["content"].strip()
+        card_store.put_advice(cache_key, advice)
         return advice
     except Exception as e:
         print("Errore nella generazione del consiglio:", e)
@@ -135,52 +175,38 @@ Non iniziare la risposta elencando l'elenco delle carte o Numero totale di carte
     )
 
 def load_card_list_from_text(text):
-    lines = text.splitlines()
-    pdf_cards = []  # lista unica per il PDF
-    ai_cards_dict = OrderedDict()  # conta le carte mantenendo l'ordine
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        match = re.match(r'^(\d+)\s+(.+)$', line)
-        if match:
-            count = int(match.group(1))
-            card_name = match.group(2).strip()
-        else:
-            count = 1
-            card_name = line
-        if card_name not in pdf_cards:
-            pdf_cards.append(card_name)
-        if card_name in ai_cards_dict:
-            ai_cards_dict[card_name] += count
-        else:
-            ai_cards_dict[card_name] = count
-    ai_cards = [f"{count} {card}" for card, count in ai_cards_dict.items()]
-    return pdf_cards, ai_cards, ai_cards_dict
+    """
+    Restituisce (nomi unici per il PDF, ["N Nome" per i consigli], {nome:
+    quantità}) dall'elenco incollato nella GUI; i formati accettati sono
+    quelli di decklist.iter_decklist.
+    """
+    pdf_cards, ai_cards, card_counts, _ = decklist.summarize(decklist.iter_decklist(text))
+    return pdf_cards, ai_cards, card_counts
 
 def draw_mana_cost(c, mana_cost, x, y, symbol_width=15, symbol_height=15):
-    from PIL import Image
-    symbols = re.findall(r'\{([^}]+)\}', mana_cost)
-    for symbol in symbols:
-        image_path = os.path.join(MANA_SYMBOLS_DIR, f"{symbol}.png")
-        if os.path.exists(image_path):
-            try:
-                img = Image.open(image_path).convert("RGBA")
-                background = Image.new("RGBA", img.size, (255, 255, 255, 255))
-                composite = Image.alpha_composite(background, img)
-                composite = composite.convert("RGB")
-                img_reader = ImageReader(composite)
-                c.drawImage(img_reader, x, y, width=symbol_width, height=symbol_height, preserveAspectRatio=True)
-            except Exception as e:
-                print(f"Errore nel disegno del simbolo mana {symbol}: {e}")
-        else:
+    images = get_registry(c)
+    for symbol in mana_symbols.parse_mana_cost(mana_cost):
+        try:
+            # Simboli già composti su fondo bianco, incorporati una sola volta per PDF
+            digest, reader = mana_symbols.get_symbol(symbol)
+            images.draw_reader(digest, reader, x, y, symbol_width, symbol_height)
+        except Exception as e:
+            print(f"Errore nel disegno del simbolo mana {symbol}: {e}")
             c.setFont(FONT_NAME, symbol_height)
             c.drawString(x, y, symbol)
         x += symbol_width + 2
 
 def draw_summary_page(c, current_y, page_width, total_height, margin_left, margin_right,
                       num_cards, summary_total_price, avg_price, avg_cmc, ai_cards, deck_colors,
-                      pre_generated_advice=None):
+                      pre_generated_advice=None, paged=False):
+    """
+    Disegna riassunto e consigli a partire da current_y e restituisce la
+    nuova posizione verticale. Con paged=True total_height è l'altezza di un
+    foglio e il consiglio, se troppo lungo, prosegue sulle pagine successive.
+    """
+    from reportlab.platypus import Paragraph
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    register_fonts()
     c.setFont(FONT_BOLD, 20)
     c.drawCentredString(page_width / 2, current_y - 50, "Riassunto e Consigli")
     c.setFont(FONT_NAME, 14)
@@ -213,6 +239,9 @@ def draw_summary_page(c, current_y, page_width, total_height, margin_left, margi
     )
     advice_paragraph = Paragraph(formatted_advice, advice_style)
     available_width = page_width - margin_left - margin_right
+    if paged:
+        return _draw_split_paragraph(c, advice_paragraph, margin_left, current_y - 180, available_width,
+                                     total_height)
     _, advice_height = advice_paragraph.wrap(available_width, total_height)
     advice_y = current_y - 180 - advice_height
     advice_paragraph.drawOn(c, margin_left, advice_y)
@@ -220,88 +249,591 @@ def draw_summary_page(c, current_y, page_width, total_height, margin_left, margi
     current_y -= summary_height
     return current_y
 
-def create_pdf(pdf_cards, ai_cards, card_counts, output_pdf, generation_mode="both",
-               lands_exclusion="none", version_exclusion="include", progress_callback=None):
+def _draw_split_paragraph(c, paragraph, x, top_y, width, page_height):
+    """
+    Disegna un paragrafo a partire da top_y, spezzandolo su più pagine se
+    non entra in quella corrente. Restituisce la posizione sotto il testo.
+    """
+    pending = [paragraph]
+    while pending:
+        part = pending.pop(0)
+        available_height = top_y - PAGE_MARGIN_BOTTOM
+        _, height = part.wrap(width, available_height)
+        if height > available_height:
+            pieces = part.split(width, available_height)
+            if pieces:
+                part, pending = pieces[0], pieces[1:] + pending
+                _, height = part.wrap(width, available_height)
+            elif top_y < page_height - PAGE_MARGIN_TOP:
+                # Nemmeno una riga entra qui: si riparte da una pagina nuova
+                c.showPage()
+                top_y = page_height - PAGE_MARGIN_TOP
+                pending.insert(0, part)
+                continue
+        part.drawOn(c, x, top_y - height)
+        top_y -= height
+        if pending:
+            c.showPage()
+            top_y = page_height - PAGE_MARGIN_TOP
+    return top_y
+
+def is_excluded(card_name, main_data, lands_exclusion="none"):
+    """Indica (stampando il motivo) se la carta va esclusa dal PDF secondo lands_exclusion."""
+    if lands_exclusion == "basic":
+        basic_lands = {"plains", "island", "swamp", "mountain", "forest"}
+        if card_name.lower() in basic_lands:
+            print(f"Escludo '{card_name}' perché è una basic land.")
+            return True
+    elif lands_exclusion == "all":
+        type_line = main_data.get("type_line", "")
+        if "Land" in type_line:
+            print(f"Escludo '{card_name}' perché è una land.")
+            return True
+    return False
+
+def fetch_card_bundle(card_name, version_exclusion="include", cancelled=None, main_data=None):
+    """
+    Raccoglie tutto ciò che serve per disegnare una carta (dati, testo in
+    italiano, prezzo, stampe e immagini). Restituisce None se la carta non
+    è stata trovata. Pensata per essere eseguita in parallelo. `main_data`,
+    se indicato, sono i dati già risolti della carta (es. una stampa precisa
+    della lista): immagine principale e prezzo vengono da lì.
+    "complete" è False se qualcosa (stampe, immagini, traduzione) non è
+    stato recuperato per un errore: la sezione si può disegnare, ma non va
+    salvata nella cache dei frammenti.
+    """
+    cancellation.check(cancelled)
+    with metrics.span("fetch", card=card_name):
+        if main_data is None:
+            main_data = resolve_card(card_name, lang="en", cancelled=cancelled)
+        if not main_data:
+            return None
+
+        if version_exclusion == "exclude":
+            printing_data = []
+        else:
+            with metrics.span("fetch.printings"):
+                printing_data = get_card_printings(main_data, lang=PRINTINGS_LANG, paper_only=PRINTINGS_PAPER_ONLY,
+                                                   limit=PRINTINGS_LIMIT, cancelled=cancelled)
+        complete = printing_data is not None
+        printing_data = printing_data or []
+
+        # Immagine principale e miniature delle stampe vengono scaricate insieme, in parallelo
+        images = [(main_data, "normal")] + [(printing, printing_image_variant(printing)) for printing in printing_data]
+        with metrics.span("fetch.images"):
+            image_paths = image_store.prefetch_images(images, cancelled)
+        # Nel PDF finiscono copie ridotte alla dimensione di stampa, non gli originali
+        with metrics.span("fetch.derivatives"):
+            main_img_path = image_store.get_derivative(image_paths[0], *MAIN_IMG_SIZE)
+            print_img_paths = [image_store.get_derivative(path, *GRID_IMG_SIZE) for path in image_paths[1:]]
+            image_store.save_manifest()
+        # Un'immagine che esiste su Scryfall ma manca va ritentata la prossima volta
+        complete = complete and all(path or not image_store.image_url(data, variant)
+                                    for path, (data, variant) in zip([main_img_path] + print_img_paths, images))
+        with metrics.span("fetch.text_price"):
+            # La traduzione si cerca per oracle_id dai dati già risolti: anche per
+            # una stampa precisa non serve risolvere di nuovo la carta per nome
+            oracle_id = main_data.get("oracle_id")
+            if oracle_id:
+                translations = fetch_translations([oracle_id], "it", cancelled)
+                # Una carta senza traduzione è nel risultato con None; se manca, la ricerca è fallita
+                complete = complete and oracle_id in translations
+                text_it = translations.get(oracle_id)
+            else:
+                text_it = main_data.get("oracle_text")
+            text_it = text_it or "Testo non disponibile in italiano"
+            price_info = format_card_price(main_data)
+        return {
+            "card_name": card_name,
+            "main_data": main_data,
+            "printing_data": printing_data,
+            "text_it": text_it,
+            "price_info": price_info,
+            "main_img_path": main_img_path,
+            "print_img_paths": print_img_paths,
+            "complete": complete,
+        }
+
+def iter_card_bundles(card_names, version_exclusion="include", workers=FETCH_WORKERS, depth=FETCH_QUEUE_SIZE,
+                      cancelled=None, on_ready=None, card_data=None):
+    """
+    Prepara i bundle delle carte con `workers` thread e li restituisce
+    nell'ordine del mazzo man mano che sono pronti, così il disegno può
+    iniziare dalla prima carta mentre le altre vengono ancora scaricate.
+    Le prime `depth` carte partono subito, già alla chiamata; poi al massimo
+    `depth` carte sono in preparazione o in attesa di essere consumate: se il
+    disegno è più lento, i thread si fermano ad aspettarlo.
+    Con `cancelled` (threading.Event) impostato le carte in coda vengono
+    scartate e l'attesa si interrompe con cancellation.OperationCancelled.
+    on_ready(), se indicata, viene chiamata dal thread che ha preparato
+    ciascuna carta appena è pronta, prima che venga consumata.
+    card_data, se indicato, associa ai nomi i dati già risolti (vedi
+    fetch_card_bundle).
+    """
+    card_data = card_data or {}
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    def card_done(future):
+        if not future.cancelled() and future.exception() is None:
+            on_ready()
+
+    def submit(card_name):
+        future = executor.submit(fetch_card_bundle, card_name, version_exclusion, cancelled,
+                                 card_data.get(card_name))
+        if on_ready is not None:
+            future.add_done_callback(card_done)
+        return future
+
+    names = iter(card_names)
+    pending = deque(submit(card_name) for card_name in islice(names, depth))
+    return _consume_bundles(executor, names, pending, submit, cancelled)
+
+def _consume_bundles(executor, names, pending, submit, cancelled):
+    try:
+        while pending:
+            future = pending.popleft()
+            for card_name in islice(names, 1):
+                pending.append(submit(card_name))
+            yield cancellation.result(future, cancelled)
+    finally:
+        # Se il consumatore si interrompe, le carte non ancora avviate non vengono scaricate
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+# Da incrementare quando cambia il modo in cui una sezione viene impaginata:
+# invalida tutti i frammenti salvati nella cache
+FRAGMENT_VERSION = 1
+_paragraph_styles = {}
+
+def _paragraph_style(font_size, leading):
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    style = _paragraph_styles.get((FONT_NAME, font_size, leading))
+    if style is None:
+        style = _paragraph_styles[(FONT_NAME, font_size, leading)] = ParagraphStyle(
+            f"Section{font_size}",
+            parent=getSampleStyleSheet()["Normal"],
+            fontName=FONT_NAME,
+            fontSize=font_size,
+            leading=leading
+        )
+    return style
+
+def section_geometry():
+    """Misure delle sezioni delle carte, tutte in punti."""
+    page_width, page_height = PAGE_SIZE
+    margin_left = margin_right = 50
+    grid_img_width, grid_img_height = GRID_IMG_SIZE
+    grid_spacing_x = 15
     header_top_margin = 20
     header_font_size = 16
-    header_height = header_top_margin + header_font_size + 10
+    return {
+        "page_width": page_width,
+        "margin_left": margin_left,
+        "margin_right": margin_right,
+        "header_top_margin": header_top_margin,
+        "header_font_size": header_font_size,
+        "header_height": header_top_margin + header_font_size + 10,
+        "main_img_size": list(MAIN_IMG_SIZE),
+        "grid_img_size": list(GRID_IMG_SIZE),
+        "grid_spacing_x": grid_spacing_x,
+        "grid_spacing_y": 35,
+        "grid_cols": max(1, int((page_width - margin_left - margin_right + grid_spacing_x)
+                                // (grid_img_width + grid_spacing_x))),
+        "margin_bottom": 100,
+    }
+
+def fragment_key(card_name, main_data, text_it, version_exclusion, geometry, vocabulary, usd_to_eur):
+    """
+    Chiave del frammento di una carta: cambia se cambiano il nome mostrato,
+    i dati della carta (prezzi compresi), il testo in italiano, il cambio
+    USD -> EUR con cui si convertono i prezzi, le opzioni e i filtri che ne
+    modificano la sezione, le misure della pagina, i font o il vocabolario
+    delle meccaniche (`vocabulary` è un'impronta del vocabolario).
+    """
+    payload = json.dumps({
+        "version": FRAGMENT_VERSION,
+        "card_name": card_name,
+        "card": main_data,
+        "text_it": text_it,
+        "usd_to_eur": usd_to_eur,
+        "version_exclusion": version_exclusion,
+        "printings_filters": [PRINTINGS_LANG, PRINTINGS_PAPER_ONLY, PRINTINGS_LIMIT],
+        "geometry": geometry,
+        "fonts": [FONT_NAME, FONT_BOLD],
+        "vocabulary": vocabulary,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def layout_card_section(bundle, matcher, geometry):
+    """
+    Impagina la sezione di una carta senza disegnarla. Il risultato (il
+    "frammento") è un dizionario serializzabile in JSON: l'intestazione con
+    immagine e testi e le righe della griglia delle stampe, ciascuna come
+    elenco di operazioni di disegno con coordinate relative alla propria
+    cima (o alla base delle immagini, per le righe). draw_card_section lo
+    riproduce a qualunque altezza e su qualunque pagina.
+    """
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.platypus import Paragraph
+    register_fonts()
+    card_name = bundle["card_name"]
+    main_data = bundle["main_data"]
+    printing_data = bundle["printing_data"]
+    price_info = bundle["price_info"]
+    page_width = geometry["page_width"]
+    header_height = geometry["header_height"]
+    main_img_width, main_img_height = geometry["main_img_size"]
+    grid_img_width, grid_img_height = geometry["grid_img_size"]
+    grid_cols = geometry["grid_cols"]
+
+    if printing_data:
+        grid_top_margin = 20
+        rows = math.ceil(len(printing_data) / grid_cols)
+        prints_height = rows * (grid_img_height + geometry["grid_spacing_y"]) - geometry["grid_spacing_y"]
+    else:
+        grid_top_margin = 0
+        prints_height = 0
+    card_height = header_height + main_img_height + grid_top_margin + prints_height + geometry["margin_bottom"]
+
+    head = [["font", FONT_BOLD, geometry["header_font_size"]],
+            ["text", 50, -geometry["header_top_margin"], card_name]]
+    main_img_dy = -header_height - main_img_height
+    if bundle["main_img_path"]:
+        # Passando il percorso, ReportLab incorpora il JPEG così com'è senza decodificarlo
+        head.append(["image", bundle["main_img_path"], 50, main_img_dy, main_img_width, main_img_height])
+
+    text_x = 50 + main_img_width + 20
+    text_width = page_width - text_x - geometry["margin_right"]
+    text_y = -header_height - 20
+
+    head += [["font", FONT_BOLD, 12], ["text", text_x, text_y, "Effetto:"]]
+    text_y -= 15
+    effect_text = bundle["text_it"].replace("\n", "<br/>")
+    _, h_eff = Paragraph(effect_text, _paragraph_style(12, 14)).wrap(text_width, 999999)
+    head.append(["paragraph", text_x, text_y - h_eff, text_width, effect_text, 12, 14])
+    text_y -= (h_eff + 15)
+
+    head += [["font", FONT_BOLD, 12], ["text", text_x, text_y, "Prezzo:"], ["font", FONT_NAME, 10]]
+    text_y -= 15
+    if price_info.strip() == "Prezzo non disponibile":
+        price_info += "\n"
+    for line in price_info.split("\n"):
+        head.append(["text", text_x, text_y, line])
+        text_y -= 15
+
+    mana_cost = main_data.get("mana_cost", "")
+    if mana_cost:
+        head += [["font", FONT_BOLD, 12], ["text", text_x, text_y, "Costo in mana:"]]
+        text_y -= 20
+        head.append(["mana", mana_cost, text_x, text_y, 15])
+        text_y -= 20
+
+    artist = main_data.get("artist", "Artista non disponibile")
+    head += [["font", FONT_BOLD, 12], ["text", text_x, text_y, "Artista:"]]
+    text_y -= 15
+    head += [["font", FONT_NAME, 10], ["text", text_x, text_y, artist]]
+    text_y -= 20
+
+    mechanics_found = matcher.find(main_data.get("oracle_text", ""))
+    head += [["font", FONT_BOLD, 12], ["text", text_x, text_y, "Meccaniche:"]]
+    text_y -= 25
+    head.append(["font", FONT_NAME, 10])
+    if mechanics_found:
+        current_x = text_x
+        comma_space = stringWidth(", ", FONT_NAME, 10)
+        for mech_idx, mechanic in enumerate(mechanics_found):
+            mech_width = stringWidth(mechanic, FONT_NAME, 10)
+            head.append(["text", current_x, text_y - 7, mechanic])
+            head.append(["note", current_x, text_y, current_x + mech_width, text_y + 10,
+                         mechanic, matcher.describe(mechanic)])
+            current_x += mech_width
+            if mech_idx < len(mechanics_found) - 1:
+                head.append(["text", current_x, text_y, ", "])
+                current_x += comma_space
+    else:
+        head.append(["text", text_x, text_y, "Nessuna meccanica trovata."])
+
+    # Ogni riga della griglia è relativa alla base delle sue immagini
+    grid_rows = []
+    for print_idx, (printing, print_img_path) in enumerate(zip(printing_data, bundle["print_img_paths"])):
+        col = print_idx % grid_cols
+        if col == 0:
+            grid_rows.append([])
+        x = geometry["margin_left"] + col * (grid_img_width + geometry["grid_spacing_x"])
+        if print_img_path:
+            grid_rows[-1].append(["image", print_img_path, x, 0, grid_img_width, grid_img_height])
+        set_name = printing.get("set_name", "Sconosciuto")
+        released_at = printing.get("released_at", "Data sconosciuta")
+        if released_at != "Data sconosciuta" and len(released_at) >= 4:
+            released_at = released_at[:4]
+            combined_text = f"{set_name} - {released_at}"
+        else:
+            combined_text = set_name
+        prices_printing = printing.get("prices", {})
+        price_str = None
+        if prices_printing.get("eur"):
+            price_str = prices_printing.get("eur")
+        elif prices_printing.get("usd"):
+            try:
+                price_str = f"{round(float(prices_printing.get('usd')) * 1, 2)}"
+            except Exception:
+                price_str = None
+        if price_str:
+            combined_text += f" - {price_str}€"
+        available_set_width = grid_img_width - 10
+        _, h_set = Paragraph(combined_text, _paragraph_style(8, 10)).wrap(available_set_width, grid_img_height)
+        grid_rows[-1].append(["paragraph", x + 5, -h_set, available_set_width, combined_text, 8, 10])
+
+    return {
+        "card_name": card_name,
+        "height": card_height,
+        # L'intestazione, l'immagine principale e la prima riga di stampe restano insieme
+        "keep": min(card_height, header_height + main_img_height + 200),
+        "head": head,
+        "main_img_dy": main_img_dy,
+        "grid_dy": main_img_dy - grid_top_margin - 120,
+        "row_height": grid_img_height,
+        "row_step": grid_img_height + geometry["grid_spacing_y"],
+        "rows": grid_rows,
+        "line_x": [30, page_width - 30],
+    }
+
+def _fragment_images(fragment):
+    return [op[1] for ops in [fragment["head"]] + fragment["rows"] for op in ops if op[0] == "image"]
+
+def _draw_ops(c, ops, y, card_name):
+    """Esegue le operazioni di un frammento con le coordinate verticali relative a y."""
+    from reportlab.platypus import Paragraph
+    images = get_registry(c)
+    for op in ops:
+        kind = op[0]
+        if kind == "font":
+            c.setFont(op[1], op[2])
+        elif kind == "text":
+            c.drawString(op[1], y + op[2], op[3])
+        elif kind == "paragraph":
+            _, x, dy, width, text, font_size, leading = op
+            paragraph = Paragraph(text, _paragraph_style(font_size, leading))
+            paragraph.wrap(width, 999999)
+            paragraph.drawOn(c, x, y + dy)
+        elif kind == "image":
+            _, path, x, dy, width, height = op
+            try:
+                images.draw(path, x, y + dy, width, height)
+            except Exception as e:
+                print(f"Errore nel disegno di un'immagine per '{card_name}': {e}")
+        elif kind == "mana":
+            draw_mana_cost(c, op[1], op[2], y + op[3], symbol_width=op[4], symbol_height=op[4])
+        elif kind == "note":
+            _, x1, dy1, x2, dy2, title, contents = op
+            try:
+                from reportlab.pdfbase.pdfdoc import PDFDictionary, PDFName, PDFArray, PDFString
+                ann = PDFDictionary()
+                ann["Type"] = PDFName("Annot")
+                ann["Subtype"] = PDFName("Text")
+                ann["Rect"] = PDFArray([x1, y + dy1, x2, y + dy2])
+                ann["Contents"] = PDFString(contents)
+                ann["T"] = PDFString(title)
+                c._addAnnotation(ann)
+            except Exception as e:
+                print(f"Errore nell'aggiunta dell'annotazione per {title}: {e}")
 
-    main_img_x = 50
-    main_img_width = 200
-    main_img_height = 280
-    main_top_margin = header_height
+def draw_card_section(c, fragment, y, ensure_space):
+    """
+    Disegna un frammento a partire dall'altezza y e restituisce la posizione
+    verticale della sezione successiva. ensure_space(y, necessario) decide
+    i cambi pagina: l'intestazione resta unita alla prima riga della griglia
+    e ogni riga che non entra nella pagina corrente passa alla successiva.
+    """
+    card_name = fragment["card_name"]
+    base_y = ensure_space(y, fragment["keep"])
+    _draw_ops(c, fragment["head"], base_y, card_name)
+    row_height = fragment["row_height"]
+    if fragment["rows"]:
+        row_y = base_y + fragment["grid_dy"]  # base delle immagini della riga corrente
+        for row_idx, ops in enumerate(fragment["rows"]):
+            if row_idx:
+                row_y -= fragment["row_step"]
+            # Sotto la riga servono spazio per le didascalie e per il separatore
+            row_y = ensure_space(row_y + row_height, row_height + 60) - row_height
+            _draw_ops(c, ops, row_y, card_name)
+        line_y, next_y = row_y - 50, row_y - 90
+    else:
+        main_img_y = base_y + fragment["main_img_dy"]
+        line_y, next_y = main_img_y - 60, main_img_y - 100
+    # Separatore sotto l'ultima riga della griglia (o sotto l'immagine principale)
+    c.setLineWidth(1)
+    c.line(fragment["line_x"][0], line_y, fragment["line_x"][1], line_y)
+    return next_y
+
+def iter_card_sections(deck_cards, keys, version_exclusion, matcher, geometry, cancelled=None,
+                       progress_callback=None, card_data=None):
+    """
+    Restituisce (nome, frammento) per ogni carta nell'ordine del mazzo; il
+    frammento è None se la carta non è stata trovata. `keys` associa a ogni
+    carta la chiave del suo frammento (fragment_key), `card_data` i dati già
+    risolti, passati a iter_card_bundles. Le carte già in cache
+    non vengono né scaricate né impaginate, le altre passano da
+    iter_card_bundles e il loro frammento viene salvato per le prossime
+    generazioni. progress_callback(pronte, totale, "fetch") segue la
+    preparazione dei dati, anche dai thread che scaricano.
+    Come iter_card_bundles, la lettura della cache e l'avvio dei download
+    avvengono già alla chiamata, non al primo frammento richiesto: il
+    riepilogo può attendere i consigli mentre le carte si scaricano.
+    """
+    cached = {}
+    for card_name in deck_cards:
+        fragment = card_store.get_fragment(keys[card_name])
+        # Un frammento che rimanda a immagini non più in cache va rifatto; il
+        # controllo usa il manifest delle immagini, non un accesso al disco per file
+        if fragment is not None and all(image_store.is_cached(path) for path in _fragment_images(fragment)):
+            metrics.cache("fragments", "disk")
+            cached[card_name] = fragment
+        else:
+            metrics.cache("fragments", "miss")
+    missing = [card_name for card_name in deck_cards if card_name not in cached]
+
+    ready = len(cached)
+    ready_lock = threading.Lock()
+
+    def card_ready():
+        nonlocal ready
+        with ready_lock:
+            ready += 1
+            progress_callback(ready, len(deck_cards), "fetch")
+
+    if progress_callback and cached:
+        progress_callback(ready, len(deck_cards), "fetch")
+    # fetch_wait è il tempo in cui il disegno resta fermo ad aspettare i dati
+    bundles = metrics.timed(iter_card_bundles(missing, version_exclusion, cancelled=cancelled,
+                                              on_ready=card_ready if progress_callback else None,
+                                              card_data=card_data),
+                            "fetch_wait")
+    return _emit_sections(deck_cards, keys, cached, bundles, matcher, geometry)
+
+def _emit_sections(deck_cards, keys, cached, bundles, matcher, geometry):
+    for card_name in deck_cards:
+        fragment = cached.get(card_name)
+        if fragment is None:
+            bundle = next(bundles)
+            if bundle is not None:
+                with metrics.span("layout", card=card_name):
+                    fragment = layout_card_section(bundle, matcher, geometry)
+                # Una sezione ripiegata su un errore temporaneo non deve restare in cache per FRAGMENT_TTL
+                if bundle["complete"]:
+                    card_store.put_fragment(keys[card_name], fragment)
+        yield card_name, fragment
+
+def create_pdf(pdf_cards, ai_cards, card_counts, output_pdf, generation_mode="both",
+               lands_exclusion="none", version_exclusion="include", progress_callback=None, layout=PDF_LAYOUT,
+               report_path=None, profile=None, cancelled=None, printings=None):
+    """
+    Genera il PDF del mazzo. Con layout="pages" il contenuto viene impaginato
+    su fogli PAGE_SIZE, chiudendo ogni pagina appena è piena; con
+    layout="single" tutto il mazzo finisce in un'unica pagina alta quanto serve.
+
+    progress_callback(fatti, totale, fase) riceve l'avanzamento delle carte
+    nella fase "fetch" (dati e immagini pronti, anche da thread secondari) e
+    nella fase "render" (carte disegnate). Se `cancelled` (threading.Event)
+    viene impostato, entro circa un secondo create_pdf solleva
+    cancellation.OperationCancelled senza scrivere il PDF: le carte in coda
+    vengono scartate e le attese di rete si interrompono.
+
+    printings associa ad alcune carte una stampa precisa (set, numero da
+    collezionista), come quelle di decklist.summarize: immagine principale,
+    prezzo e artista sono quelli di quella stampa.
+
+    Restituisce il report delle metriche (tempi per fase e per carta,
+    richieste HTTP, byte, attese del rate limiter, esiti delle cache), salvato
+    anche come JSON in report_path se indicato. profile="cpu" o "memory"
+    aggiunge al report un profilo cProfile o tracemalloc della generazione;
+    con "cpu" il profilo completo va accanto al PDF (o al report) come .prof.
+    """
+    metrics.reset()
+    # Ogni generazione parte dalla cache su disco: in una sessione lunga della
+    # GUI i prezzi risolti ore prima non devono finire nel nuovo PDF
+    clear_resolved_cards()
+    limiter_before = dict(limiter.stats)
+    profile_path = os.path.splitext(report_path or output_pdf)[0] + ".prof" if profile == "cpu" else None
+    with metrics.capture(profile, profile_path) as captured:
+        with metrics.span("total"):
+            _create_pdf(pdf_cards, ai_cards, card_counts, output_pdf, generation_mode, lands_exclusion,
+                        version_exclusion, progress_callback, layout, cancelled, printings or {})
+    report = metrics.report()
+    report["rate_limiter"] = {key: round(value - limiter_before[key], 4) for key, value in limiter.stats.items()}
+    report["pdf_bytes"] = os.path.getsize(output_pdf)
+    if captured:
+        report["profile"] = captured
+    if report_path:
+        metrics.save_report(report, report_path)
+    return report
+
+def _create_pdf(pdf_cards, ai_cards, card_counts, output_pdf, generation_mode, lands_exclusion,
+                version_exclusion, progress_callback, layout, cancelled, printings):
+    from reportlab import rl_config
+    from reportlab.pdfgen import canvas
+    from reportlab.platypus import Paragraph
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    register_fonts()
+    # Stream binari: senza ASCII85 i JPEG vengono copiati nel PDF così come
+    # sono, invece di essere ricodificati in Python puro a ogni generazione
+    rl_config.useA85 = 0
 
     margin_left = 50
     margin_right = 50
-    page_width, _ = letter
+    page_width, page_height = PAGE_SIZE
     available_width = page_width - margin_left - margin_right
-    grid_img_width = 90
-    grid_img_height = 110
-    grid_spacing_x = 15
-    grid_spacing_y = 35
-    grid_cols = max(1, int((available_width + grid_spacing_x) // (grid_img_width + grid_spacing_x)))
 
-    margin_bottom = 100
     base_summary_height = 180
     extra_space = 800
 
-    cards_info = []
     total_cards_height = 0
     summary_total_price = 0.0
     total_count = 0
     summary_total_cmc = 0.0
     deck_colors_set = set()
 
+    # Prima passata: risolve tutto il mazzo a blocchi tramite /cards/collection,
+    # cercando per set e numero le carte di cui la lista indica la stampa
+    with metrics.span("resolve"):
+        exact = resolve_printings([printings[name] for name in pdf_cards if name in printings], cancelled)
+        resolved = {}
+        for name in pdf_cards:
+            set_code, collector_number = printings.get(name, ("", None))
+            if (set_code.lower(), collector_number) in exact:
+                resolved[name] = exact[(set_code.lower(), collector_number)]
+        by_name, not_found = resolve_cards([name for name in pdf_cards if name not in resolved],
+                                           cancelled=cancelled)
+        resolved.update(by_name)
+    not_found = set(not_found)
+    # ... e cerca le traduzioni in italiano di tutte le carte con poche ricerche
+    with metrics.span("translations"):
+        translations = fetch_translations([data["oracle_id"] for data in resolved.values() if data.get("oracle_id")],
+                                          "it", cancelled)
+
+    for card_name in not_found:
+        print(f"Carta non trovata: '{card_name}'.")
+
+    # Esclusioni e riepilogo usano solo i dati già risolti: il riassunto può
+    # essere disegnato prima che arrivino testi, stampe e immagini delle carte
+    deck_cards = []
+    deck_data = {}
     for card_name in pdf_cards:
-        count = card_counts.get(card_name, 1)
-        main_data = fetch_card_data(card_name, lang="en")
-        if not main_data:
+        if card_name in not_found:
             continue
-
-        if lands_exclusion == "basic":
-            basic_lands = {"plains", "island", "swamp", "mountain", "forest"}
-            if card_name.lower() in basic_lands:
-                print(f"Escludo '{card_name}' perché è una basic land.")
-                continue
-        elif lands_exclusion == "all":
-            type_line = main_data.get("type_line", "")
-            if "Land" in type_line:
-                print(f"Escludo '{card_name}' perché è una land.")
-                continue
+        # Le carte di un blocco fallito vengono ritentate una alla volta
+        main_data = resolved.get(card_name) or resolve_card(card_name, lang="en", cancelled=cancelled)
+        if not main_data or is_excluded(card_name, main_data, lands_exclusion):
+            continue
+        deck_cards.append(card_name)
+        deck_data[card_name] = main_data
+        count = card_counts.get(card_name, 1)
 
         total_count += count
         if "colors" in main_data:
             deck_colors_set.update(main_data["colors"])
 
-        if version_exclusion == "exclude":
-            printing_data = []
-        else:
-            prints_uri = main_data.get("prints_search_uri")
-            printing_data = []
-            if prints_uri:
-                try:
-                    import requests
-                    response = requests.get(prints_uri)
-                    response.raise_for_status()
-                    printing_data = response.json().get("data", [])
-                except Exception as e:
-                    print(f"Errore nel recupero delle stampe per '{card_name}': {e}")
-
-        text_it = get_card_text_in_italian(card_name)
-        price_info = get_card_price(card_name)
-        main_img_path = download_card_image(card_name)
-
-        if printing_data:
-            grid_top_margin = 20
-            rows = math.ceil(len(printing_data) / grid_cols)
-            prints_height = rows * (grid_img_height + grid_spacing_y) - grid_spacing_y
-        else:
-            grid_top_margin = 0
-            prints_height = 0
-
-        card_height = header_height + main_img_height + grid_top_margin + prints_height + margin_bottom
-        total_cards_height += card_height
-
         prices = main_data.get("prices", {})
         price_value = None
         if prices.get("eur"):
@@ -311,8 +843,7 @@ def create_pdf(pdf_cards, ai_cards, card_counts, output_pdf, generation_mode="bo
                 pass
         elif prices.get("usd"):
             try:
-                from scryfall_api import USD_TO_EUR
-                price_value = float(prices["usd"]) * USD_TO_EUR
+                price_value = float(prices["usd"]) * get_usd_to_eur_rate()
             except Exception:
                 pass
         if price_value is not None:
@@ -320,24 +851,47 @@ def create_pdf(pdf_cards, ai_cards, card_counts, output_pdf, generation_mode="bo
         cmc = main_data.get("cmc", 0)
         summary_total_cmc += cmc * count
 
-        cards_info.append({
-            "card_name": card_name,
-            "main_data": main_data,
-            "printing_data": printing_data,
-            "text_it": text_it,
-            "price_info": price_info,
-            "main_img_path": main_img_path,
-            "card_height": card_height,
-            "grid_top_margin": grid_top_margin,
-            "prints_height": prints_height,
-            "count": count
-        })
-
     num_cards = total_count
     avg_price = summary_total_price / total_count if total_count > 0 else 0
     avg_cmc = summary_total_cmc / total_count if total_count > 0 else 0
     deck_colors = ", ".join(sorted(deck_colors_set)) if deck_colors_set else "Colorless"
 
+    # Il consiglio dipende solo dai totali: la richiesta parte subito e procede
+    # mentre le carte vengono scaricate, il riassunto la attende solo quando serve
+    advice_future = None
+    if generation_mode in ("both", "suggestions"):
+        advice_executor = ThreadPoolExecutor(max_workers=1)
+        advice_future = advice_executor.submit(generate_targeted_advice, num_cards, summary_total_price,
+                                               avg_price, avg_cmc, ai_cards, deck_colors)
+        advice_executor.shutdown(wait=False)
+
+    # Seconda passata: le sezioni delle carte già generate con gli stessi dati
+    # e le stesse opzioni vengono dalla cache dei frammenti; per le altre
+    # testi, prezzi, stampe e immagini vengono preparati in parallelo e
+    # consumati dal disegno nell'ordine del mazzo
+    sections = iter(())
+    if generation_mode in ("both", "cards"):
+        try:
+            matcher = mechanics.get_matcher()
+        except Exception as e:
+            print(f"Errore nel caricamento del vocabolario: {e}")
+            matcher = mechanics.MechanicsMatcher({})
+        geometry = section_geometry()
+        vocabulary = hashlib.sha256(json.dumps(matcher.vocab, sort_keys=True).encode("utf-8")).hexdigest()
+        usd_to_eur = get_usd_to_eur_rate()
+        keys = {card_name: fragment_key(card_name, deck_data[card_name],
+                                        translations.get(deck_data[card_name].get("oracle_id")),
+                                        version_exclusion, geometry, vocabulary, usd_to_eur)
+                for card_name in deck_cards}
+        sections = iter_card_sections(deck_cards, keys, version_exclusion, matcher, geometry, cancelled,
+                                      progress_callback, deck_data)
+        if layout == "single":
+            # L'altezza dell'unica pagina dipende da tutte le carte: qui serve
+            # attendere l'intero mazzo prima di iniziare a disegnare
+            prepared = deque(sections)
+            total_cards_height = sum(fragment["height"] for _, fragment in prepared if fragment)
+            sections = (prepared.popleft() for _ in range(len(prepared)))
+
     if generation_mode in ("both", "suggestions"):
         styles = getSampleStyleSheet()
         advice_style = ParagraphStyle(
@@ -359,205 +913,56 @@ def create_pdf(pdf_cards, ai_cards, card_counts, output_pdf, generation_mode="bo
     else:
         summary_height = 0
 
-    if generation_mode == "both":
+    if layout != "single":
+        total_height = page_height  # ogni pagina è alta quanto PAGE_SIZE
+    elif generation_mode == "both":
         total_height = summary_height + total_cards_height + extra_space
     elif generation_mode == "cards":
         total_height = total_cards_height + extra_space
     elif generation_mode == "suggestions":
         total_height = summary_height + 200
 
-    c = canvas.Canvas(output_pdf, pagesize=(page_width, total_height))
-    current_y = total_height
+    if layout == "single":
+        c = canvas.Canvas(output_pdf, pagesize=(page_width, total_height))
+        current_y = total_height
+    else:
+        c = canvas.Canvas(output_pdf, pagesize=PAGE_SIZE)
+        current_y = page_height
+
+    def ensure_space(y, needed):
+        """
+        Nel layout a pagine, se sotto y non restano `needed` punti chiude la
+        pagina corrente e restituisce la cima della nuova pagina.
+        """
+        if layout != "single" and y - needed < PAGE_MARGIN_BOTTOM:
+            c.showPage()
+            return page_height - PAGE_MARGIN_TOP
+        return y
 
     if generation_mode in ("both", "suggestions"):
-        current_y = draw_summary_page(
-            c, current_y, page_width, total_height, margin_left, margin_right,
-            num_cards, summary_total_price, avg_price, avg_cmc, ai_cards, deck_colors
-        )
+        with metrics.span("advice_wait"):
+            advice = cancellation.result(advice_future, cancelled)
+        with metrics.span("summary"):
+            current_y = draw_summary_page(
+                c, current_y, page_width, total_height, margin_left, margin_right,
+                num_cards, summary_total_price, avg_price, avg_cmc, ai_cards, deck_colors,
+                pre_generated_advice=advice, paged=layout != "single"
+            )
+        if generation_mode == "both" and layout != "single":
+            # Le carte iniziano su una pagina nuova
+            c.showPage()
+            current_y = page_height - PAGE_MARGIN_TOP
 
     if generation_mode in ("both", "cards"):
-        for idx, info in enumerate(cards_info):
-            card_name = info["card_name"]
-            printing_data = info["printing_data"]
-            text_it = info["text_it"]
-            price_info = info["price_info"]
-            main_img_path = info["main_img_path"]
-            card_height = info["card_height"]
-            grid_top_margin = info["grid_top_margin"]
-            main_data = info["main_data"]
-
-            base_y = current_y
-
-            c.setFont(FONT_BOLD, header_font_size)
-            c.drawString(50, base_y - header_top_margin, card_name)
-
-            main_img_y = base_y - main_top_margin - main_img_height
-            if main_img_path:
-                try:
-                    from PIL import Image
-                    img = Image.open(main_img_path)
-                    img_reader = ImageReader(img)
-                    c.drawImage(
-                        img_reader, 50, main_img_y,
-                        width=main_img_width, height=main_img_height,
-                        preserveAspectRatio=True
-                    )
-                except Exception as e:
-                    print(f"Errore nel disegno dell'immagine principale per '{card_name}': {e}")
-
-            current_text_x = 50 + main_img_width + 20
-            text_y = base_y - main_top_margin - 20
-
-            c.setFont(FONT_BOLD, 12)
-            c.drawString(current_text_x, text_y, "Effetto:")
-            text_y -= 15
-
-            styles = getSampleStyleSheet()
-            effect_style = ParagraphStyle(
-                "EffectStyle",
-                parent=styles["Normal"],
-                fontName=FONT_NAME,
-                fontSize=12,
-                leading=14
-            )
-            effect_text = text_it.replace("\n", "<br/>")
-            effect_paragraph = Paragraph(effect_text, effect_style)
-            available_effect_width = page_width - current_text_x - margin_right
-            w_eff, h_eff = effect_paragraph.wrap(available_effect_width, text_y)
-            effect_paragraph.drawOn(c, current_text_x, text_y - h_eff)
-            text_y -= (h_eff + 15)
-
-            c.setFont(FONT_BOLD, 12)
-            c.drawString(current_text_x, text_y, "Prezzo:")
-            text_y -= 15
-            c.setFont(FONT_NAME, 10)
-            if price_info.strip() == "Prezzo non disponibile":
-                price_info += "\n"
-            for line in price_info.split("\n"):
-                c.drawString(current_text_x, text_y, line)
-                text_y -= 15
-
-            mana_cost = main_data.get("mana_cost", "")
-            if mana_cost:
-                c.setFont(FONT_BOLD, 12)
-                c.drawString(current_text_x, text_y, "Costo in mana:")
-                text_y -= 20
-                draw_mana_cost(c, mana_cost, current_text_x, text_y, symbol_width=15, symbol_height=15)
-                text_y -= 20
-
-            artist = main_data.get("artist", "Artista non disponibile")
-            c.setFont(FONT_BOLD, 12)
-            c.drawString(current_text_x, text_y, "Artista:")
-            text_y -= 15
-            c.setFont(FONT_NAME, 10)
-            c.drawString(current_text_x, text_y, artist)
-            text_y -= 20
-
-            if printing_data:
-                grid_start_y = main_img_y - grid_top_margin - 120
-                col = 0
-                row = 0
-                for printing in printing_data:
-                    print_img_path = download_printing_image_small(printing)
-                    x = margin_left + col * (grid_img_width + grid_spacing_x)
-                    y = grid_start_y - row * (grid_img_height + grid_spacing_y)
-                    if print_img_path:
-                        try:
-                            from PIL import Image
-                            img = Image.open(print_img_path)
-                            img_reader = ImageReader(img)
-                            c.drawImage(
-                                img_reader, x, y,
-                                width=grid_img_width, height=grid_img_height,
-                                preserveAspectRatio=True
-                            )
-                        except Exception as e:
-                            print(f"Errore nel disegno dell'immagine per una stampa di '{card_name}': {e}")
-                    set_name = printing.get("set_name", "Sconosciuto")
-                    released_at = printing.get("released_at", "Data sconosciuta")
-                    if released_at != "Data sconosciuta" and len(released_at) >= 4:
-                        released_at = released_at[:4]
-                        combined_text = f"{set_name} - {released_at}"
-                    else:
-                        combined_text = set_name
-                    prices_printing = printing.get("prices", {})
-                    price_str = None
-                    if prices_printing.get("eur"):
-                        price_str = prices_printing.get("eur")
-                    elif prices_printing.get("usd"):
-                        try:
-                            price_str = f"{round(float(prices_printing.get('usd')) * 1, 2)}"
-                        except Exception:
-                            price_str = None
-                    if price_str:
-                        combined_text += f" - {price_str}€"
-                    set_style = ParagraphStyle(
-                        "SetStyle",
-                        parent=styles["Normal"],
-                        fontName=FONT_NAME,
-                        fontSize=8,
-                        leading=10
-                    )
-                    available_set_width = grid_img_width - 10
-                    set_paragraph = Paragraph(combined_text, set_style)
-                    w_set, h_set = set_paragraph.wrap(available_set_width, grid_img_height)
-                    set_paragraph.drawOn(c, x + 5, y - h_set)
-                    col += 1
-                    if col >= grid_cols:
-                        col = 0
-                        row += 1
-
-            available_mech_width = page_width - current_text_x - margin_right
-            import json
-            vocab_path = os.path.join(os.path.dirname(__file__), "data", "vocab_wiki.json")
-            try:
-                with open(vocab_path, "r", encoding="utf-8") as f:
-                    vocab = json.load(f)
-            except Exception as e:
-                print(f"Errore nel caricamento del vocabolario: {e}")
-                vocab = {}
-            mechanics_found = []
-            text_en = main_data.get("oracle_text", "")
-            for mechanic in vocab.keys():
-                if re.search(r'\b' + re.escape(mechanic) + r'\b', text_en, re.IGNORECASE):
-                    mechanics_found.append(mechanic)
-            c.setFont(FONT_BOLD, 12)
-            c.drawString(current_text_x, text_y, "Meccaniche:")
-            text_y -= 25
-            if mechanics_found:
-                c.setFont(FONT_NAME, 10)
-                current_x = current_text_x
-                for idx, mechanic in enumerate(mechanics_found):
-                    mech_text = mechanic
-                    text_width = c.stringWidth(mech_text, FONT_NAME, 10)
-                    c.drawString(current_x, text_y - 7, mech_text)
-                    try:
-                        from reportlab.pdfbase.pdfdoc import PDFDictionary, PDFName, PDFArray, PDFString
-                        ann = PDFDictionary()
-                        ann["Type"] = PDFName("Annot")
-                        ann["Subtype"] = PDFName("Text")
-                        ann["Rect"] = PDFArray([current_x, text_y, current_x + text_width, text_y + 10])
-                        ann["Contents"] = PDFString(vocab.get(mechanic, "Descrizione non disponibile"))
-                        ann["T"] = PDFString(mechanic)
-                        c._addAnnotation(ann)
-                    except Exception as e:
-                        print(f"Errore nell'aggiunta dell'annotazione per {mechanic}: {e}")
-                    comma_space = c.stringWidth(", ", FONT_NAME, 10)
-                    current_x += text_width
-                    if idx < len(mechanics_found) - 1:
-                        c.drawString(current_x, text_y, ", ")
-                        current_x += comma_space
-                text_y -= 15
-            else:
-                c.setFont(FONT_NAME, 10)
-                c.drawString(current_text_x, text_y, "Nessuna meccanica trovata.")
-                text_y -= 15
-
-            line_y = base_y - card_height + margin_bottom - 60
-            c.setLineWidth(1)
-            c.line(30, line_y, page_width - 30, line_y)
-            current_y -= card_height
+        for idx, (card_name, fragment) in enumerate(sections):
+            cancellation.check(cancelled)
+            if fragment is not None:
+                render_start = time.perf_counter()
+                current_y = draw_card_section(c, fragment, current_y, ensure_space)
+                metrics.add_time("render", time.perf_counter() - render_start, card=card_name)
             if progress_callback:
-                progress_callback(idx + 1, len(cards_info))
-    c.save()
+                progress_callback(idx + 1, len(deck_cards), "render")
+    with metrics.span("save"):
+        c.save()
+        image_store.save_manifest()
     print(f"PDF creato: {output_pdf}")
@@ -0,0 +1,77 @@
+# pdf_images.py
+import hashlib
+import metrics
+
+
+class ImageRegistry:
+    """
+    Incorpora ogni immagine distinta (riconosciuta dall'hash del contenuto)
+    una sola volta nel PDF, come form XObject di lato unitario, e la richiama
+    con una semplice trasformazione a ogni disegno successivo: dimensione e
+    tempo di salvataggio dipendono dalle immagini distinte, non dai disegni.
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self._forms = {}  # hash del contenuto -> (nome del form, larghezza px, altezza px)
+        self._digests = {}  # percorso -> hash del contenuto
+
+    def _digest(self, path):
+        digest = self._digests.get(path)
+        if digest is None:
+            with open(path, "rb") as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            self._digests[path] = digest
+        return digest
+
+    def _register(self, digest, load):
+        form = self._forms.get(digest)
+        if form is None:
+            from reportlab.lib.utils import ImageReader
+            with metrics.span("embed_image"):
+                # Il caricamento (ed eventuale elaborazione) avviene solo la prima volta
+                source = load()
+                reader = source if isinstance(source, ImageReader) else ImageReader(source)
+                width_px, height_px = reader.getSize()
+                name = f"img{digest}"
+                self.canvas.beginForm(name, 0, 0, 1, 1)
+                self.canvas.drawImage(source, 0, 0, width=1, height=1)
+                self.canvas.endForm()
+            form = self._forms[digest] = (name, width_px, height_px)
+        return form
+
+    def draw(self, path, x, y, width, height, preserveAspectRatio=True, loader=None):
+        """
+        Disegna l'immagine in `path` nel riquadro indicato. `loader`, se
+        presente, trasforma il percorso nell'immagine da incorporare (es. una
+        PIL Image già elaborata) e viene chiamato una sola volta per contenuto.
+        Come drawImage, con preserveAspectRatio l'immagine è centrata nel riquadro.
+        """
+        form = self._register(self._digest(path), lambda: loader(path) if loader else path)
+        self._draw_form(form, x, y, width, height, preserveAspectRatio)
+
+    def draw_reader(self, digest, reader, x, y, width, height, preserveAspectRatio=True):
+        """Come draw, per un'immagine già in memoria di cui il chiamante conosce l'hash."""
+        form = self._register(digest, lambda: reader)
+        self._draw_form(form, x, y, width, height, preserveAspectRatio)
+
+    def _draw_form(self, form, x, y, width, height, preserveAspectRatio):
+        name, width_px, height_px = form
+        draw_width, draw_height = width, height
+        if preserveAspectRatio:
+            scale = min(width / width_px, height / height_px)
+            draw_width, draw_height = width_px * scale, height_px * scale
+        c = self.canvas
+        c.saveState()
+        c.translate(x + (width - draw_width) / 2, y + (height - draw_height) / 2)
+        c.scale(draw_width, draw_height)
+        c.doForm(name)
+        c.restoreState()
+
+
+def get_registry(canvas):
+    """Restituisce il registro delle immagini associato al canvas, creandolo se serve."""
+    registry = getattr(canvas, "_image_registry", None)
+    if registry is None:
+        registry = canvas._image_registry = ImageRegistry(canvas)
+    return registry
@@ -0,0 +1,161 @@
+# rate_limiter.py
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+import cancellation
+
+
+class TokenBucket:
+    """
+    Token bucket condiviso fra thread: consente raffiche fino a `burst`
+    richieste e poi un ritmo costante di `rate` richieste al secondo.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def reserve(self):
+        """Prenota un token e restituisce quanti secondi attendere prima di usarlo."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            return max(wait, self._blocked_until - now)
+
+    def block_for(self, seconds):
+        """Sospende tutte le richieste per `seconds` secondi (es. dopo un 429)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket con lo stato in memoria condivisa, per far rispettare lo
+    stesso limite complessivo a più processi. Si crea nel processo principale
+    e nei processi figli si ricostruisce passando `state` (es. negli initargs
+    di un pool): time.monotonic è lo stesso orologio per tutta la macchina.
+    """
+
+    def __init__(self, rate, burst, state=None):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        if state is None:
+            import multiprocessing
+            # token disponibili, ultimo aggiornamento, blocco (429) fino a
+            state = multiprocessing.Array("d", [float(burst), time.monotonic(), 0.0])
+        self.state = state
+
+    def reserve(self):
+        with self.state.get_lock():
+            now = time.monotonic()
+            tokens, updated, blocked_until = self.state[:]
+            if now > updated:
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                updated = now
+            tokens -= 1
+            self.state[0], self.state[1] = tokens, updated
+            wait = 0.0 if tokens >= 0 else -tokens / self.rate
+            return max(wait, blocked_until - now)
+
+    def block_for(self, seconds):
+        with self.state.get_lock():
+            self.state[2] = max(self.state[2], time.monotonic() + seconds)
+
+
+class RateLimiter:
+    """
+    Limita le richieste verso un servizio: token bucket condiviso, rispetto
+    dell'header Retry-After e backoff esponenziale con jitter per errori 5xx
+    ed errori di connessione. Tiene il conto delle richieste e del tempo
+    trascorso in attesa.
+    """
+
+    def __init__(self, rate, burst, max_retries=3, backoff_base=1.0, backoff_max=60.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "throttled_seconds": 0.0, "backoff_seconds": 0.0}
+
+    def _count(self, key, value=1):
+        with self._stats_lock:
+            self.stats[key] += value
+
+    def acquire(self, cancelled=None):
+        cancellation.check(cancelled)
+        wait = self.bucket.reserve()
+        if wait > 0:
+            self._count("throttled_seconds", wait)
+            cancellation.sleep(wait, cancelled)
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    @staticmethod
+    def _retry_after(response):
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            # Retry-After può essere anche una data HTTP
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+
+    def request(self, send, url, cancelled=None):
+        """
+        Esegue `send()` (che restituisce una risposta requests) rispettando il
+        limite e ritentando fino a max_retries volte su 429, 5xx ed errori di
+        connessione. Restituisce l'ultima risposta; se anche l'ultimo tentativo
+        fallisce per un errore di connessione, l'eccezione viene propagata.
+        Se `cancelled` (threading.Event) viene impostato, le attese del limite
+        e dei tentativi si interrompono con cancellation.OperationCancelled.
+        """
+        for attempt in range(self.max_retries):
+            self.acquire(cancelled)
+            self._count("requests")
+            last_attempt = attempt == self.max_retries - 1
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_attempt:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"Errore di connessione per {url}: {e}. Ritento dopo {delay:.1f} secondi...")
+            else:
+                if response.status_code == 429:
+                    delay = self._retry_after(response)
+                    if delay is None:
+                        delay = self._backoff(attempt)
+                    # Il 429 vale per tutti: fermiamo anche gli altri thread
+                    self.bucket.block_for(delay)
+                elif response.status_code >= 500:
+                    delay = self._backoff(attempt)
+                else:
+                    return response
+                if last_attempt:
+                    return response
+                print(f"{response.status_code} ricevuto per {url}. Ritento dopo {delay:.1f} secondi... "
+                      f"(Tentativo {attempt + 1} di {self.max_retries})")
+            self._count("retries")
+            self._count("backoff_seconds", delay)
+            cancellation.sleep(delay, cancelled)
@@ -1,57 +1,117 @@
 # scryfall_api.py
-import os
+import threading
 import time
-import requests
 import urllib.parse
+import requests
 from collections import OrderedDict
-from config import SCRYFALL_BASE_URL, EXCHANGE_RATE_URL, REQUEST_LIMIT, PAUSE_TIME, DELAY_BETWEEN, MAX_RETRIES, \
-    DEFAULT_USD_TO_EUR, CARD_IMAGES_DIR
+import card_store
+import bulk_index
+import image_store
+import metrics
+from rate_limiter import RateLimiter
+from config import SCRYFALL_BASE_URL, EXCHANGE_RATE_URL, API_RATE_LIMIT, API_BURST, MAX_RETRIES, BACKOFF_BASE, \
+    BACKOFF_MAX, API_TIMEOUT, DEFAULT_USD_TO_EUR, EXCHANGE_RATE_TTL, COLLECTION_BATCH_SIZE, TRANSLATION_BATCH_SIZE, \
+    OFFLINE_MODE
 
 session = requests.Session()
-REQUEST_COUNT = 0
+# Limiter unico condiviso da tutti i thread; limiter.stats raccoglie i contatori
+limiter = RateLimiter(API_RATE_LIMIT, API_BURST, max_retries=MAX_RETRIES,
+                      backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX)
 
+# Memoria della generazione in corso, svuotata da clear_resolved_cards all'inizio
+# di ogni PDF: fra una generazione e l'altra valgono le scadenze di card_store.
+# Carte già risolte: (nome in minuscolo, lingua) -> dati Scryfall
+_resolved_cards = {}
+# Traduzioni già risolte: (oracle_id, lingua) -> testo stampato (None se non esiste)
+_translations = {}
+# Stampe precise già risolte: (set, numero da collezionista) -> dati Scryfall
+_resolved_printings = {}
+# Elenchi completi delle stampe già scaricati: oracle_id -> lista di stampe
+_printings = {}
+# Cambio USD -> EUR in uso: (tasso, istante del download), caricato alla prima conversione
+_usd_to_eur = None
+_usd_to_eur_lock = threading.Lock()
+_usd_to_eur_refreshing = False
 
-def rate_limited_get(url, params=None):
-    global REQUEST_COUNT
-    REQUEST_COUNT += 1
-    if REQUEST_COUNT % REQUEST_LIMIT == 0:
-        time.sleep(PAUSE_TIME)
 
-    response = None
-    for attempt in range(MAX_RETRIES):
-        response = session.get(url, params=params)
-        if response.status_code != 429:
-            break
-        else:
-            backoff = PAUSE_TIME * (2 ** attempt)
-            print(
-                f"429 ricevuto per {url}. Ritento dopo {backoff} secondi... (Tentativo {attempt + 1} di {MAX_RETRIES})")
-            time.sleep(backoff)
-    time.sleep(DELAY_BETWEEN)
+# Il parametro `cancelled` delle funzioni che vanno in rete è un threading.Event:
+# impostato, interrompe le attese del limiter con cancellation.OperationCancelled.
+# `endpoint` è l'etichetta della richiesta nelle metriche (default: il percorso
+# dell'URL), per distinguere usi diversi dello stesso endpoint di Scryfall
+
+def rate_limited_get(url, params=None, cancelled=None, endpoint=None):
+    return _rate_limited_request("GET", url, cancelled, endpoint, params=params)
+
+
+def rate_limited_post(url, json=None, cancelled=None, endpoint=None):
+    return _rate_limited_request("POST", url, cancelled, endpoint, json=json)
+
+
+def _rate_limited_request(method, url, cancelled=None, endpoint=None, **kwargs):
+    # Il tempo misurato comprende le attese del limiter e gli eventuali tentativi ripetuti
+    with metrics.span("http.scryfall"):
+        response = limiter.request(lambda: session.request(method, url, timeout=API_TIMEOUT, **kwargs), url, cancelled)
+    metrics.http(endpoint or urllib.parse.urlsplit(url).path.strip("/") or url, len(response.content))
     return response
 
 
-def get_usd_to_eur_rate():
+def _download_usd_to_eur_rate():
+    """Scarica il cambio e lo salva su disco; restituisce (tasso, istante) o None in caso di errore."""
     try:
-        response = rate_limited_get(EXCHANGE_RATE_URL)
+        # Il servizio del cambio non è Scryfall: niente rate limiter, basta un timeout
+        response = session.get(EXCHANGE_RATE_URL, timeout=10)
+        metrics.http("exchange", len(response.content))
         response.raise_for_status()
-        data = response.json()
-        rate = data["rates"]["EUR"]
-        print(f"Tasso di cambio USD -> EUR aggiornato: {rate}")
-        return rate
+        rate = float(response.json()["rates"]["EUR"])
     except Exception as e:
         print(f"Errore nel download del cambio USD->EUR: {e}")
-        return DEFAULT_USD_TO_EUR
+        return None
+    print(f"Tasso di cambio USD -> EUR aggiornato: {rate}")
+    card_store.put_exchange_rate("USD_EUR", rate)
+    return rate, time.time()
+
 
+def _refresh_usd_to_eur_rate():
+    global _usd_to_eur
+    result = _download_usd_to_eur_rate()
+    if result:
+        with _usd_to_eur_lock:
+            _usd_to_eur = result
 
-USD_TO_EUR = get_usd_to_eur_rate()
 
+def get_usd_to_eur_rate():
+    """
+    Cambio USD -> EUR. Viene risolto alla prima conversione (non all'import)
+    e letto dalla cache su disco; se è più vecchio di EXCHANGE_RATE_TTL si
+    continua a usarlo mentre un thread in background lo aggiorna, una sola
+    volta per esecuzione. Solo se non è mai stato salvato viene scaricato
+    subito, e in caso di errore si usa DEFAULT_USD_TO_EUR.
+    """
+    global _usd_to_eur, _usd_to_eur_refreshing
+    if OFFLINE_MODE:
+        return DEFAULT_USD_TO_EUR
+    with _usd_to_eur_lock:
+        if _usd_to_eur is None:
+            _usd_to_eur = card_store.get_exchange_rate("USD_EUR")
+            if _usd_to_eur is None:
+                _usd_to_eur = _download_usd_to_eur_rate() or (DEFAULT_USD_TO_EUR, time.time())
+        rate, fetched_at = _usd_to_eur
+        if time.time() - fetched_at > EXCHANGE_RATE_TTL and not _usd_to_eur_refreshing:
+            _usd_to_eur_refreshing = True
+            threading.Thread(target=_refresh_usd_to_eur_rate, daemon=True).start()
+    return rate
 
-def fetch_card_data(card_name, lang="en"):
+
+def fetch_card_data(card_name, lang="en", cancelled=None):
+    if OFFLINE_MODE:
+        data = bulk_index.find_card(card_name, lang)
+        if not data:
+            print(f"'{card_name}' (lang={lang}) non presente nell'indice bulk locale.")
+        return data
     url = f"{SCRYFALL_BASE_URL}/cards/named"
     params = {"exact": card_name, "lang": lang}
     try:
-        response = rate_limited_get(url, params=params)
+        response = rate_limited_get(url, params=params, cancelled=cancelled)
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -59,56 +119,338 @@ def fetch_card_data(card_name, lang="en"):
         return None
 
 
-def download_image(url, filename):
-    try:
-        response = rate_limited_get(url)
-        response.raise_for_status()
-        with open(filename, "wb") as f:
-            f.write(response.content)
-        return filename
-    except Exception as e:
-        print(f"Errore nel download dell'immagine da {url}: {e}")
-        return None
+def resolve_card(card_name, lang="en", with_prices=True, cancelled=None):
+    """
+    Restituisce i dati della carta interrogando Scryfall solo la prima volta:
+    le chiamate successive per lo stesso nome e la stessa lingua riusano
+    lo stesso record. Prima della rete viene consultata la cache su disco;
+    con with_prices=False un record con prezzi scaduti è comunque accettato.
+    """
+    key = (card_name.lower(), lang)
+    if key in _resolved_cards:
+        metrics.cache("cards", "memory")
+        return _resolved_cards[key]
+    data, prices_fresh = card_store.get_card(card_name, lang)
+    if data is None or (with_prices and not prices_fresh):
+        metrics.cache("cards", "miss")
+        fresh_data = fetch_card_data(card_name, lang=lang, cancelled=cancelled)
+        if fresh_data:
+            card_store.put_card(card_name, lang, fresh_data)
+            data, prices_fresh = fresh_data, True
+    else:
+        metrics.cache("cards", "disk")
+    if data and prices_fresh:
+        _resolved_cards[key] = data
+    return data
+
+
+def fetch_cards_collection(card_names, cancelled=None):
+    """
+    Risolve più carte per nome con richieste POST a /cards/collection, al
+    massimo COLLECTION_BATCH_SIZE identificatori per richiesta.
+    Restituisce (dizionario nome -> dati, lista dei nomi non trovati).
+    I nomi di un blocco la cui richiesta fallisce non compaiono in nessuna
+    delle due strutture, così che il chiamante possa ritentarli singolarmente.
+    """
+    found = {}
+    not_found = []
+    if OFFLINE_MODE:
+        for name in card_names:
+            data = bulk_index.find_card(name)
+            if data:
+                found[name] = data
+            else:
+                not_found.append(name)
+        return found, not_found
+    url = f"{SCRYFALL_BASE_URL}/cards/collection"
+    for start in range(0, len(card_names), COLLECTION_BATCH_SIZE):
+        batch = card_names[start:start + COLLECTION_BATCH_SIZE]
+        try:
+            response = rate_limited_post(url, json={"identifiers": [{"name": name} for name in batch]},
+                                         cancelled=cancelled)
+            response.raise_for_status()
+            result = response.json()
+        except Exception as e:
+            print(f"Errore nella risoluzione di {len(batch)} carte tramite /cards/collection: {e}")
+            continue
+        # Le carte restituite vanno ricondotte ai nomi richiesti: il confronto
+        # ignora maiuscole/minuscole e accetta anche il nome di una singola faccia.
+        by_name = {}
+        for card in result.get("data", []):
+            by_name[card.get("name", "").lower()] = card
+            for face in card.get("card_faces", []):
+                by_name.setdefault(face.get("name", "").lower(), card)
+        for name in batch:
+            card = by_name.get(name.lower())
+            if card:
+                found[name] = card
+            else:
+                not_found.append(name)
+    return found, not_found
+
+
+def resolve_cards(card_names, with_prices=True, cancelled=None):
+    """
+    Versione multipla di resolve_card per le carte in inglese: le carte non
+    ancora in memoria o nella cache su disco vengono risolte a blocchi con
+    fetch_cards_collection. Restituisce (dizionario nome -> dati, nomi non trovati).
+    """
+    resolved = {}
+    missing = []
+    for name in card_names:
+        key = (name.lower(), "en")
+        if key in _resolved_cards:
+            metrics.cache("cards", "memory")
+            resolved[name] = _resolved_cards[key]
+            continue
+        data, prices_fresh = card_store.get_card(name, "en")
+        if data and (prices_fresh or not with_prices):
+            metrics.cache("cards", "disk")
+            if prices_fresh:
+                _resolved_cards[key] = data
+            resolved[name] = data
+        else:
+            metrics.cache("cards", "miss")
+            missing.append(name)
+    found, not_found = fetch_cards_collection(missing, cancelled)
+    for name, data in found.items():
+        card_store.put_card(name, "en", data)
+        _resolved_cards[(name.lower(), "en")] = data
+        resolved[name] = data
+    return resolved, not_found
+
+
+def resolve_printings(printings, cancelled=None):
+    """
+    Risolve stampe precise, indicate come coppie (set, numero da
+    collezionista) come quelle di decklist.summarize. Le stampe non ancora
+    in memoria o nella cache su disco vengono chieste a /cards/collection,
+    COLLECTION_BATCH_SIZE per richiesta. Restituisce {(set, numero): dati};
+    le stampe non trovate mancano dal dizionario.
+    """
+    resolved = {}
+    missing = []
+    for set_code, collector_number in dict.fromkeys((s.lower(), n) for s, n in printings):
+        key = (set_code, collector_number)
+        data = _resolved_printings.get(key)
+        if data is not None:
+            metrics.cache("printings", "memory")
+        else:
+            data = card_store.get_printing(set_code, collector_number)
+            metrics.cache("printings", "miss" if data is None else "disk")
+        if data is None:
+            missing.append(key)
+        else:
+            _resolved_printings[key] = resolved[key] = data
+    if OFFLINE_MODE:
+        for set_code, collector_number in missing:
+            try:
+                data = bulk_index.find_print(set_code, collector_number)
+            except Exception as e:
+                # Es. un indice creato prima che set e numero venissero indicizzati
+                print(f"Errore nella ricerca delle stampe nell'indice bulk (reimportarlo con bulk_index.py): {e}")
+                break
+            if data is None:
+                print(f"Stampa {set_code.upper()} {collector_number} non presente nell'indice bulk locale.")
+            else:
+                _resolved_printings[(set_code, collector_number)] = resolved[(set_code, collector_number)] = data
+        return resolved
+    url = f"{SCRYFALL_BASE_URL}/cards/collection"
+    for start in range(0, len(missing), COLLECTION_BATCH_SIZE):
+        batch = missing[start:start + COLLECTION_BATCH_SIZE]
+        identifiers = [{"set": set_code, "collector_number": number} for set_code, number in batch]
+        try:
+            response = rate_limited_post(url, json={"identifiers": identifiers}, cancelled=cancelled,
+                                         endpoint="cards/collection:printings")
+            response.raise_for_status()
+            result = response.json()
+        except Exception as e:
+            print(f"Errore nella risoluzione di {len(batch)} stampe tramite /cards/collection: {e}")
+            continue
+        requested = set(batch)
+        for card in result.get("data", []):
+            key = (card.get("set", "").lower(), card.get("collector_number"))
+            if key in requested:
+                card_store.put_printing(key[0], key[1], card)
+                _resolved_printings[key] = resolved[key] = card
+        for set_code, collector_number in batch:
+            if (set_code, collector_number) not in resolved:
+                print(f"Stampa non trovata: {set_code.upper()} {collector_number}.")
+    return resolved
+
+
+def clear_resolved_cards():
+    """
+    Svuota la memoria di carte, stampe e traduzioni: le ricerche successive
+    ripassano dalla cache su disco, che scarta i dati scaduti (es. i prezzi
+    dopo PRICE_TTL) invece di restituirli per tutta la vita del processo.
+    """
+    _resolved_cards.clear()
+    _resolved_printings.clear()
+    _translations.clear()
+    _printings.clear()
 
 
 def download_card_image(card_name):
-    safe_name = urllib.parse.quote(card_name)
-    filename = f"{safe_name}_normal.jpg"
-    img_path = os.path.join(CARD_IMAGES_DIR, filename)
-    if os.path.exists(img_path):
-        return img_path
-    data = fetch_card_data(card_name, lang="en")
-    if data and "image_uris" in data and "normal" in data["image_uris"]:
-        image_url = data["image_uris"]["normal"]
-        return download_image(image_url, img_path)
-    else:
+    data = resolve_card(card_name, lang="en")
+    img_path = image_store.get_image(data, "normal") if data else None
+    if not img_path:
         print(f"Nessuna immagine trovata per '{card_name}'.")
-    return None
+    return img_path
 
 
-def get_card_text_in_italian(card_name):
-    data_en = fetch_card_data(card_name, lang="en")
+def iter_search_results(url, params=None, cancelled=None, endpoint=None):
+    """
+    Scorre tutte le pagine di una ricerca Scryfall (has_more/next_page)
+    passando dal rate limiter. Una ricerca senza risultati (404) non produce
+    nulla; gli altri errori HTTP vengono propagati.
+    """
+    while url:
+        response = rate_limited_get(url, params=params, cancelled=cancelled, endpoint=endpoint)
+        if response.status_code == 404:
+            return
+        response.raise_for_status()
+        page = response.json()
+        yield from page.get("data", [])
+        url = page.get("next_page") if page.get("has_more") else None
+        # next_page contiene già tutti i parametri della ricerca
+        params = None
+
+
+def fetch_translations(oracle_ids, lang="it", cancelled=None):
+    """
+    Restituisce {oracle_id: testo stampato nella lingua richiesta, o None}.
+    Le carte non ancora in memoria o nella cache su disco vengono cercate a
+    gruppi di TRANSLATION_BATCH_SIZE con un'unica ricerca
+    "(oracleid:a or oracleid:b ...) lang:xx", seguendone tutte le pagine.
+    """
+    translations = {}
+    missing = []
+    for oracle_id in dict.fromkeys(oracle_ids):
+        key = (oracle_id, lang)
+        if key in _translations:
+            metrics.cache("translations", "memory")
+            translations[oracle_id] = _translations[key]
+            continue
+        if OFFLINE_MODE:
+            found, printed_text = bulk_index.find_translation(oracle_id, lang)
+        else:
+            found, printed_text = card_store.get_translation(oracle_id, lang)
+        if found or OFFLINE_MODE:
+            metrics.cache("translations", "disk")
+            _translations[key] = translations[oracle_id] = printed_text
+        else:
+            metrics.cache("translations", "miss")
+            missing.append(oracle_id)
+
+    search_url = f"{SCRYFALL_BASE_URL}/cards/search"
+    for start in range(0, len(missing), TRANSLATION_BATCH_SIZE):
+        batch = missing[start:start + TRANSLATION_BATCH_SIZE]
+        query = " or ".join(f"oracleid:{oracle_id}" for oracle_id in batch)
+        params = {"q": f"({query}) lang:{lang}", "unique": "prints"}
+        found = {}
+        try:
+            for card in iter_search_results(search_url, params=params, cancelled=cancelled,
+                                            endpoint="cards/search:translations"):
+                found.setdefault(bulk_index.card_oracle_id(card), bulk_index.card_printed_text(card))
+        except Exception as e:
+            print(f"Errore nella ricerca delle traduzioni (lang={lang}) per {len(batch)} carte: {e}")
+            continue
+        # Anche le carte senza traduzione vengono ricordate, per non ripetere la ricerca
+        for oracle_id in batch:
+            printed_text = found.get(oracle_id)
+            card_store.put_translation(oracle_id, lang, printed_text)
+            _translations[(oracle_id, lang)] = translations[oracle_id] = printed_text
+    return translations
+
+
+def get_card_text(card_name, lang, cancelled=None):
+    """
+    Testo stampato della carta nella lingua richiesta, o None se la carta
+    non è stata trovata o non esiste in quella lingua.
+    """
+    data_en = resolve_card(card_name, lang="en", cancelled=cancelled)
     if not data_en:
-        return "Carta non trovata in italiano"
+        return None
     oracle_id = data_en.get("oracle_id")
     if not oracle_id:
+        return None
+    return fetch_translations([oracle_id], lang, cancelled).get(oracle_id)
+
+
+def get_card_text_in_italian(card_name, cancelled=None):
+    data_en = resolve_card(card_name, lang="en", cancelled=cancelled)
+    if not data_en:
+        return "Carta non trovata in italiano"
+    if not data_en.get("oracle_id"):
         return data_en.get("oracle_text", "Testo non disponibile in italiano")
-    search_url = f"{SCRYFALL_BASE_URL}/cards/search"
-    params = {"q": f"oracleid:{oracle_id} lang:it", "unique": "prints"}
-    try:
-        response = rate_limited_get(search_url, params=params)
-        response.raise_for_status()
-        data_it = response.json()
-        if data_it and data_it.get("data"):
-            italian_card = data_it["data"][0]
-            return italian_card.get("printed_text", "Testo non disponibile in italiano")
-    except Exception as e:
-        print(f"Errore nella ricerca della traduzione in italiano per '{card_name}': {e}")
-    return "Testo non disponibile in italiano"
+    return get_card_text(card_name, "it", cancelled) or "Testo non disponibile in italiano"
+
+
+def _fetch_all_printings(card_data, cancelled=None, lang=None):
+    """
+    Elenco delle stampe della carta. prints_search_uri restituisce solo le
+    stampe in inglese: con una lingua diversa viene aggiunto
+    include_multilingual, e l'elenco (più lungo) viene conservato a parte.
+    """
+    oracle_id = card_data.get("oracle_id")
+    multilingual = lang not in (None, "en")
+    key = f"{oracle_id}:multilingual" if oracle_id and multilingual else oracle_id
+    if key and key in _printings:
+        metrics.cache("prints", "memory")
+        return _printings[key]
+    if OFFLINE_MODE:
+        return bulk_index.find_printings(oracle_id, lang or "en") if oracle_id else []
+    printings = card_store.get_prints(key) if key else None
+    metrics.cache("prints", "miss" if printings is None else "disk")
+    if printings is None:
+        prints_uri = card_data.get("prints_search_uri")
+        if not prints_uri:
+            return []
+        params = {"include_multilingual": "true"} if multilingual else None
+        try:
+            printings = list(iter_search_results(prints_uri, params=params, cancelled=cancelled,
+                                                 endpoint="cards/search:prints"))
+        except Exception as e:
+            print(f"Errore nel recupero delle stampe per '{card_data.get('name')}': {e}")
+            return None
+        if key:
+            card_store.put_prints(key, printings)
+    if key:
+        _printings[key] = printings
+    return printings
+
+
+def get_card_printings(card_data, lang=None, paper_only=False, limit=None, cancelled=None):
+    """
+    Restituisce le stampe della carta scorrendo tutte le pagine di
+    prints_search_uri; l'elenco completo viene conservato per oracle_id in
+    memoria e nella cache su disco. I filtri vengono applicati prima di
+    restituire il risultato, così da non scaricare immagini inutili:
+      - lang: solo le stampe in quella lingua (diversa da "en": l'elenco
+        viene chiesto con include_multilingual)
+      - paper_only: solo le stampe cartacee
+      - limit: al massimo questo numero di stampe
+    Restituisce None se l'elenco non è stato scaricato per un errore.
+    """
+    printings = _fetch_all_printings(card_data, cancelled, lang)
+    if printings is None:
+        return None
+    if lang:
+        printings = [printing for printing in printings if printing.get("lang") == lang]
+    if paper_only:
+        printings = [printing for printing in printings if "paper" in printing.get("games", [])]
+    if limit is not None:
+        printings = printings[:limit]
+    return printings
+
+
+def get_card_price(card_name, cancelled=None):
+    return format_card_price(resolve_card(card_name, lang="en", cancelled=cancelled))
 
 
-def get_card_price(card_name):
-    data = fetch_card_data(card_name, lang="en")
+def format_card_price(data):
+    """Testo con i prezzi normale e foil in euro dei dati Scryfall indicati (carta o stampa precisa)."""
     if data:
         prices = data.get("prices", {})
         price_eur = prices.get("eur")
@@ -117,14 +459,14 @@ def get_card_price(card_name):
             price_usd = prices.get("usd")
             if price_usd:
                 try:
-                    price_eur = f"{round(float(price_usd) * USD_TO_EUR, 2)}"
+                    price_eur = f"{round(float(price_usd) * get_usd_to_eur_rate(), 2)}"
                 except Exception:
                     price_eur = None
         if not price_eur_foil:
             price_usd_foil = prices.get("usd_foil")
             if price_usd_foil:
                 try:
-                    price_eur_foil = f"{round(float(price_usd_foil) * USD_TO_EUR, 2)}"
+                    price_eur_foil = f"{round(float(price_usd_foil) * get_usd_to_eur_rate(), 2)}"
                 except Exception:
                     price_eur_foil = None
         if not price_eur and not price_eur_foil:
@@ -142,21 +484,9 @@ def get_card_price(card_name):
     return "Prezzo non disponibile"
 
 
+def printing_image_variant(printing):
+    return "small" if image_store.image_url(printing, "small") else "normal"
+
+
 def download_printing_image_small(printing):
-    if "image_uris" in printing:
-        if "small" in printing["image_uris"]:
-            image_url = printing["image_uris"]["small"]
-            suffix = "small"
-        elif "normal" in printing["image_uris"]:
-            image_url = printing["image_uris"]["normal"]
-            suffix = "normal"
-        else:
-            return None
-        safe_id = printing.get("id", printing.get("name", "unknown"))
-        safe_id = urllib.parse.quote(safe_id)
-        filename = f"{safe_id}_{suffix}.jpg"
-        img_path = os.path.join(CARD_IMAGES_DIR, filename)
-        if os.path.exists(img_path):
-            return img_path
-        return download_image(image_url, img_path)
-    return None
+    return image_store.get_image(printing, printing_image_variant(printing))